@@ -1,19 +1,25 @@
 """
 API route definitions for the fraud detection service.
 """
+import asyncio
 import logging
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Awaitable, Dict, List, Optional, Set
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import select, insert, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
 
-from app.db.session import get_db, check_db_health
+from app.db.session import get_db, get_read_db, check_db_health, insert_ignore
 from app.db.models import User, Transaction, RiskLog
 from app.cache.redis_client import redis_client
-from app.scoring.engine import evaluate_transaction, TransactionInput
+from app.scoring.engine import (
+    evaluate_transaction, evaluate_transactions, fetch_scoring_context, fetch_scoring_contexts,
+    invalidate_amount_fallback, TransactionInput, RiskResult
+)
 from app.schemas import (
-    TransactionRequest, TransactionResponse,
+    TransactionRequest, TransactionBatchRequest, TransactionResponse,
     RiskDetailResponse, FlaggedTransactionResponse,
     HealthResponse, ErrorResponse
 )
@@ -23,6 +29,95 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Idempotency lookup, built once at import and reused with a bound tid.
+# Projects only columns held in idx_risk_txid_covering (index-only scan).
+_IDEMPOTENCY_STMT = select(RiskLog.risk_score, RiskLog.reasons).where(
+    RiskLog.transaction_id == bindparam("tid")
+)
+
+# Cache writes still in flight; holds strong references until each task finishes
+_pending_cache_writes: Set[asyncio.Task] = set()
+
+
+# Seconds between background health probes
+HEALTH_PROBE_INTERVAL = 2.0
+
+
+def schedule_cache_write(write: Awaitable) -> asyncio.Task:
+    """Run a post-commit cache write without delaying the response."""
+    task = asyncio.ensure_future(write)
+    _pending_cache_writes.add(task)
+    task.add_done_callback(_pending_cache_writes.discard)
+    return task
+
+
+async def drain_cache_writes():
+    """Wait for in-flight cache writes (called on shutdown)."""
+    if _pending_cache_writes:
+        await asyncio.gather(*_pending_cache_writes, return_exceptions=True)
+
+
+def _transaction_input(request: TransactionRequest) -> TransactionInput:
+    """Build the scoring input for a validated request."""
+    return TransactionInput(
+        transaction_id=request.transaction_id,
+        user_id=request.user_id,
+        amount=request.amount,
+        currency=request.currency,
+        merchant_id=request.merchant_id,
+        timestamp=request.timestamp,
+        location_lat=request.location.lat if request.location else None,
+        location_lng=request.location.lng if request.location else None,
+        device_id=request.device_id,
+        metadata=request.metadata
+    )
+
+
+def _transaction_row(tx: TransactionInput) -> Dict[str, Any]:
+    """Column values for the transactions insert."""
+    return {
+        "transaction_id": tx.transaction_id,
+        "user_id": tx.user_id,
+        "amount": tx.amount,
+        "currency": tx.currency,
+        "merchant_id": tx.merchant_id,
+        "timestamp": tx.timestamp,
+        "location_lat": tx.location_lat,
+        "location_lng": tx.location_lng,
+        "device_id": tx.device_id,
+        "tx_metadata": tx.metadata,
+    }
+
+
+def _risk_log_row(tx: TransactionInput, result: RiskResult, evaluated_at: datetime) -> Dict[str, Any]:
+    """Column values for the risk_logs insert."""
+    return {
+        "transaction_id": tx.transaction_id,
+        "user_id": tx.user_id,
+        "risk_score": result.score,
+        "reasons": result.reasons,
+        "raw_evidence": result.evidence,
+        "evaluated_at": evaluated_at,
+    }
+
+
+def _cache_record(tx: TransactionInput, result: RiskResult) -> Dict[str, Any]:
+    """Keyword arguments for RedisClient.record_transaction."""
+    return {
+        "user_id": tx.user_id,
+        "device_id": tx.device_id,
+        "lat": tx.location_lat,
+        "lng": tx.location_lng,
+        "timestamp": tx.timestamp,
+        "tx_id": tx.transaction_id,
+        "amount": tx.amount,
+        "risk_result": {
+            "risk_score": result.score,
+            "risk_reasons": result.reasons,
+            "flagged": result.flagged,
+        },
+    }
+
 
 @router.post(
     "/transactions",
@@ -34,109 +129,64 @@ router = APIRouter()
     summary="Process a new transaction",
     description="Submit a financial transaction for fraud risk evaluation"
 )
-def process_transaction(
+async def process_transaction(
     request: TransactionRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Process a new transaction and evaluate fraud risk.
     
     - Creates user if not exists
-    - Stores transaction
     - Runs fraud scoring engine
-    - Stores risk log
+    - Stores transaction and risk log
     - Updates Redis cache
     """
     try:
+        # Replays of recent transactions are answered from Redis
+        cached = await redis_client.get_risk_result(request.transaction_id)
+        if cached is not None:
+            return TransactionResponse(transaction_id=request.transaction_id, **cached)
+        
         # Check if transaction already exists (idempotency)
-        existing_log = db.query(RiskLog).filter(
-            RiskLog.transaction_id == request.transaction_id
-        ).first()
+        existing_log = (await db.execute(
+            _IDEMPOTENCY_STMT, {"tid": request.transaction_id}
+        )).first()
         
         if existing_log:
             # Return existing result for idempotency
             return TransactionResponse(
-                transaction_id=existing_log.transaction_id,
+                transaction_id=request.transaction_id,
                 risk_score=existing_log.risk_score,
                 risk_reasons=existing_log.reasons,
                 flagged=existing_log.risk_score >= settings.FLAG_THRESHOLD
             )
         
-        # Create or get user
-        user = db.query(User).filter(User.user_id == request.user_id).first()
-        if not user:
-            user = User(user_id=request.user_id)
-            db.add(user)
-            db.flush()
-        
-        # Create transaction record
-        transaction = Transaction(
-            transaction_id=request.transaction_id,
-            user_id=request.user_id,
-            amount=request.amount,
-            currency=request.currency,
-            merchant_id=request.merchant_id,
-            timestamp=request.timestamp,
-            location_lat=request.location.lat if request.location else None,
-            location_lng=request.location.lng if request.location else None,
-            device_id=request.device_id,
-            tx_metadata=request.metadata
-        )
-        db.add(transaction)
-        db.flush()
-        
         # Build transaction input for scoring
-        tx_input = TransactionInput(
-            transaction_id=request.transaction_id,
-            user_id=request.user_id,
-            amount=request.amount,
-            currency=request.currency,
-            merchant_id=request.merchant_id,
-            timestamp=request.timestamp,
-            location_lat=request.location.lat if request.location else None,
-            location_lng=request.location.lng if request.location else None,
-            device_id=request.device_id,
-            metadata=request.metadata
+        tx_input = _transaction_input(request)
+        
+        # Create user if not exists (no-op on conflict, no SELECT needed),
+        # overlapped with the independent Redis fetch of the rule inputs
+        _, context = await asyncio.gather(
+            db.execute(insert_ignore(db, User).values(user_id=request.user_id)),
+            fetch_scoring_context(tx_input)
         )
         
-        # Evaluate fraud risk
-        risk_result = evaluate_transaction(tx_input, db)
+        # Evaluate fraud risk (history excludes the transaction being scored)
+        risk_result = await evaluate_transaction(tx_input, db, context)
         
-        # Store risk log
-        risk_log = RiskLog(
-            transaction_id=request.transaction_id,
-            user_id=request.user_id,
-            risk_score=risk_result.score,
-            reasons=risk_result.reasons,
-            raw_evidence=risk_result.evidence,
-            evaluated_at=datetime.utcnow()
-        )
-        db.add(risk_log)
+        # Store transaction and risk log back-to-back, no intermediate flush
+        await db.execute(insert(Transaction).values(**_transaction_row(tx_input)))
+        await db.execute(insert(RiskLog).values(
+            **_risk_log_row(tx_input, risk_result, datetime.utcnow())
+        ))
         
         # Commit all changes
-        db.commit()
+        await db.commit()
+        invalidate_amount_fallback(tx_input.user_id)
         
-        # Update Redis cache (after successful commit)
-        try:
-            # Update last known device/location
-            if request.device_id or request.location:
-                redis_client.set_last_known(
-                    user_id=request.user_id,
-                    device_id=request.device_id or "",
-                    lat=request.location.lat if request.location else None,
-                    lng=request.location.lng if request.location else None,
-                    timestamp=request.timestamp
-                )
-            
-            # Add to recent transactions
-            redis_client.add_recent_transaction(
-                user_id=request.user_id,
-                timestamp=request.timestamp,
-                tx_id=request.transaction_id
-            )
-        except Exception as cache_error:
-            # Log but don't fail the request for cache errors
-            logger.warning(f"Cache update failed: {cache_error}")
+        # Update Redis cache in the background (after successful commit).
+        # record_transaction logs its own failures, so the response never waits on it.
+        schedule_cache_write(redis_client.record_transaction(**_cache_record(tx_input, risk_result)))
         
         return TransactionResponse(
             transaction_id=request.transaction_id,
@@ -148,8 +198,98 @@ def process_transaction(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
-        logger.error(f"Error processing transaction: {e}")
+        await db.rollback()
+        logger.error("Error processing transaction: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post(
+    "/transactions/batch",
+    response_model=List[TransactionResponse],
+    responses={
+        400: {"model": ErrorResponse},
+        500: {"model": ErrorResponse}
+    },
+    summary="Process a batch of transactions",
+    description="Submit up to 1000 transactions for fraud risk evaluation in one request"
+)
+async def process_transaction_batch(
+    batch: TransactionBatchRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Process a batch of transactions with one round-trip per stage:
+    one idempotency query, one Redis pipeline for every rule input,
+    one amount history query for users whose Redis buckets are missing,
+    one multi-row insert per table, and one Redis pipeline for cache updates.
+    
+    Transactions are scored in request order, each seeing the earlier
+    transactions of the batch as if they had been sent one by one
+    (velocity, last known device/location, amount stats, duplicates).
+    Results are returned in request order.
+    """
+    try:
+        # First occurrence of each transaction_id is processed; repeats share its result
+        requests: Dict[str, TransactionRequest] = {}
+        for r in batch.transactions:
+            requests.setdefault(r.transaction_id, r)
+        
+        existing = {
+            row.transaction_id: TransactionResponse(
+                transaction_id=row.transaction_id,
+                risk_score=row.risk_score,
+                risk_reasons=row.reasons,
+                flagged=row.risk_score >= settings.FLAG_THRESHOLD
+            )
+            for row in await db.execute(
+                select(RiskLog.transaction_id, RiskLog.risk_score, RiskLog.reasons)
+                .where(RiskLog.transaction_id.in_(list(requests)))
+            )
+        }
+        tx_inputs = [
+            _transaction_input(r) for r in requests.values()
+            if r.transaction_id not in existing
+        ]
+        
+        results = dict(existing)
+        if tx_inputs:
+            users = [{"user_id": user_id} for user_id in {tx.user_id for tx in tx_inputs}]
+            _, contexts = await asyncio.gather(
+                db.execute(insert_ignore(db, User).values(users)),
+                fetch_scoring_contexts(tx_inputs)
+            )
+            
+            risk_results = await evaluate_transactions(tx_inputs, db, contexts)
+            
+            evaluated_at = datetime.utcnow()
+            await db.execute(insert(Transaction), [_transaction_row(tx) for tx in tx_inputs])
+            await db.execute(insert(RiskLog), [
+                _risk_log_row(tx, result, evaluated_at)
+                for tx, result in zip(tx_inputs, risk_results)
+            ])
+            await db.commit()
+            for user in users:
+                invalidate_amount_fallback(user["user_id"])
+            
+            schedule_cache_write(redis_client.record_transactions(
+                [_cache_record(tx, result) for tx, result in zip(tx_inputs, risk_results)]
+            ))
+            
+            for tx, result in zip(tx_inputs, risk_results):
+                results[tx.transaction_id] = TransactionResponse(
+                    transaction_id=tx.transaction_id,
+                    risk_score=result.score,
+                    risk_reasons=result.reasons,
+                    flagged=result.flagged
+                )
+        
+        return [results[r.transaction_id] for r in batch.transactions]
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        logger.error("Error processing transaction batch: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -160,14 +300,16 @@ def process_transaction(
     summary="Get risk evaluation for a transaction",
     description="Retrieve the stored risk evaluation result for a specific transaction"
 )
-def get_risk(
+async def get_risk(
     transaction_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get stored risk evaluation for a transaction."""
-    risk_log = db.query(RiskLog).filter(
-        RiskLog.transaction_id == transaction_id
-    ).first()
+    risk_log = (await db.execute(
+        select(RiskLog)
+        .options(undefer(RiskLog.raw_evidence))
+        .where(RiskLog.transaction_id == transaction_id)
+    )).scalar_one_or_none()
     
     if not risk_log:
         raise HTTPException(
@@ -192,36 +334,37 @@ def get_risk(
     summary="List flagged transactions",
     description="Retrieve a list of transactions with risk scores above the threshold"
 )
-def get_flagged_transactions(
+async def get_flagged_transactions(
     min_score: int = Query(default=50, ge=0, le=100, description="Minimum risk score"),
     limit: int = Query(default=50, ge=1, le=500, description="Maximum number of results"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get list of flagged transactions.
     Filters by minimum score and limits results.
     """
-    results = db.query(RiskLog, Transaction).join(
+    stmt = select(
+        RiskLog.transaction_id,
+        RiskLog.user_id,
+        Transaction.amount,
+        Transaction.merchant_id,
+        RiskLog.risk_score,
+        RiskLog.reasons.label("risk_reasons"),
+        Transaction.timestamp,
+        RiskLog.evaluated_at
+    ).join(
         Transaction, RiskLog.transaction_id == Transaction.transaction_id
-    ).filter(
+    ).where(
         RiskLog.risk_score >= min_score
     ).order_by(
         RiskLog.risk_score.desc(),
         RiskLog.evaluated_at.desc()
-    ).limit(limit).all()
+    ).limit(limit)
     
+    # Plain column rows - no ORM instances are built for this listing
     return [
-        FlaggedTransactionResponse(
-            transaction_id=risk_log.transaction_id,
-            user_id=risk_log.user_id,
-            amount=transaction.amount,
-            merchant_id=transaction.merchant_id,
-            risk_score=risk_log.risk_score,
-            risk_reasons=risk_log.reasons,
-            timestamp=transaction.timestamp,
-            evaluated_at=risk_log.evaluated_at
-        )
-        for risk_log, transaction in results
+        FlaggedTransactionResponse(**row._mapping)
+        for row in await db.execute(stmt)
     ]
 
 
@@ -231,13 +374,16 @@ def get_flagged_transactions(
     summary="Health check",
     description="Check the health status of the service, database, and Redis"
 )
-def health_check():
+async def health_check(request: Request):
     """
     Health check endpoint.
     Returns status of database and Redis connections.
+    Serves the snapshot kept by health_probe_loop, probing inline if none is running.
     """
-    db_health = check_db_health()
-    redis_health = redis_client.health_check()
+    health = getattr(request.app.state, "health", None)
+    if health is None:
+        health = await probe_health()
+    db_health, redis_health = health["database"], health["redis"]
     
     overall_status = "healthy"
     if db_health["status"] != "healthy" or redis_health["status"] != "healthy":
@@ -249,3 +395,27 @@ def health_check():
         redis=redis_health,
         timestamp=datetime.utcnow()
     )
+
+
+async def probe_health(force: bool = False) -> dict:
+    """
+    Probe database and Redis once.
+    With force, both checks skip their HEALTH_TTL caches and probe live.
+    """
+    db_health, redis_health = await asyncio.gather(
+        check_db_health(force=force), redis_client.health_check(force=force)
+    )
+    return {"database": db_health, "redis": redis_health}
+
+
+async def health_probe_loop(state) -> None:
+    """
+    Refresh state.health every HEALTH_PROBE_INTERVAL seconds until cancelled.
+    Probes bypass the TTL caches, so the snapshot is at most one interval old.
+    """
+    while True:
+        await asyncio.sleep(HEALTH_PROBE_INTERVAL)
+        try:
+            state.health = await probe_health(force=True)
+        except Exception as e:
+            logger.warning("Health probe failed: %s", e)
@@ -2,17 +2,40 @@
 Redis caching layer for fraud detection.
 Handles sliding windows, last known device/location tracking.
 """
-import redis
-import json
+import redis.asyncio as redis
+import hashlib
+import orjson
 import logging
-from datetime import datetime, timedelta
-from typing import Optional, Dict, List, Tuple
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional, Dict, Iterable, List, Sequence, Tuple
 
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
 
+def utc_epoch(timestamp: datetime) -> float:
+    """
+    Epoch seconds for a timestamp, reading naive values as UTC (as stored)
+    rather than as the host's local time.
+    """
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.timestamp()
+
+
+@dataclass
+class ScoringContext:
+    """Redis state needed to score one transaction, fetched in one round-trip."""
+    count_high: int = 0  # transactions in the velocity spike window
+    count_unusual: int = 0  # transactions in the unusual velocity window
+    last_known: Optional[Dict] = None
+    is_duplicate: bool = False
+    amount_stats: Optional[Tuple[float, int]] = None  # (sum, count); None = buckets not built
+
+
 class RedisClient:
     """Redis client wrapper for fraud detection caching."""
     
@@ -20,9 +43,18 @@ class RedisClient:
     LAST_KNOWN_PREFIX = "LAST_KNOWN:"
     RECENT_TX_PREFIX = "RECENT_TX:"
     TX_HASH_PREFIX = "TX_HASH:"  # For duplicate detection
+    AMOUNT_STATS_PREFIX = "AMOUNT_STATS:"  # Daily amount sum/count buckets
+    RISK_RESULT_PREFIX = "RISK:"  # Persisted risk results, for idempotent replays
+    
+    RECENT_TX_TTL = 86400  # seconds of history kept in the recent window (24 hours)
+    AMOUNT_WINDOW_DAYS = 30  # days of daily buckets kept per user
+    AMOUNT_STATS_TTL = 31 * 86400  # idle users' buckets expire once all are stale
+    RISK_RESULT_TTL = 3600  # replays after this fall back to the database
+    HEALTH_TTL = 5.0  # seconds a health snapshot is reused
     
     def __init__(self):
         self._client: Optional[redis.Redis] = None
+        self._health_cache: Optional[Tuple[float, dict]] = None
     
     @property
     def client(self) -> redis.Redis:
@@ -36,30 +68,36 @@ class RedisClient:
             )
         return self._client
     
-    def ping(self) -> bool:
+    async def close(self):
+        """Close the connection pool (called on application shutdown)."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    async def ping(self) -> bool:
         """Check Redis connectivity."""
         try:
-            return self.client.ping()
+            return await self.client.ping()
         except Exception as e:
-            logger.error(f"Redis ping failed: {e}")
+            logger.error("Redis ping failed: %s", e)
             return False
     
-    def get_last_known(self, user_id: str) -> Optional[Dict]:
+    async def get_last_known(self, user_id: str) -> Optional[Dict]:
         """
         Get last known device and location for a user.
-        Returns: {device_id, lat, lng, last_timestamp}
+        Returns: {device_id, lat, lng, last_ts} (last_ts in epoch seconds)
         """
         try:
             key = f"{self.LAST_KNOWN_PREFIX}{user_id}"
-            data = self.client.get(key)
+            data = await self.client.get(key)
             if data:
-                return json.loads(data)
+                return orjson.loads(data)
             return None
         except Exception as e:
-            logger.error(f"Error getting last known for {user_id}: {e}")
+            logger.error("Error getting last known for %s: %s", user_id, e)
             return None
     
-    def set_last_known(
+    async def set_last_known(
         self, 
         user_id: str, 
         device_id: str, 
@@ -69,37 +107,265 @@ class RedisClient:
     ):
         """Update last known device and location for a user."""
         try:
-            key = f"{self.LAST_KNOWN_PREFIX}{user_id}"
-            data = {
-                "device_id": device_id,
-                "lat": lat,
-                "lng": lng,
-                "last_timestamp": timestamp.isoformat()
-            }
+            key, payload = self._last_known_entry(user_id, device_id, lat, lng, timestamp)
             # Keep for 30 days
-            self.client.setex(key, timedelta(days=30), json.dumps(data))
+            await self.client.setex(key, timedelta(days=30), payload)
         except Exception as e:
-            logger.error(f"Error setting last known for {user_id}: {e}")
+            logger.error("Error setting last known for %s: %s", user_id, e)
     
-    def add_recent_transaction(self, user_id: str, timestamp: datetime, tx_id: str):
+    async def add_recent_transaction(self, user_id: str, timestamp: datetime, tx_id: str):
         """
         Add a transaction timestamp to user's recent transaction set.
         Uses sorted set with timestamp as score for efficient range queries.
         """
         try:
-            key = f"{self.RECENT_TX_PREFIX}{user_id}"
-            score = timestamp.timestamp()
-            # Store tx_id as member with timestamp as score
-            self.client.zadd(key, {tx_id: score})
-            # Clean up old entries (keep last 24 hours)
-            cutoff = (datetime.utcnow() - timedelta(hours=24)).timestamp()
-            self.client.zremrangebyscore(key, "-inf", cutoff)
-            # Set expiry on the key
-            self.client.expire(key, 86400)  # 24 hours
+            async with self.client.pipeline(transaction=True) as pipe:
+                self._queue_recent_transaction(pipe, user_id, timestamp, tx_id)
+                await pipe.execute()
+        except Exception as e:
+            logger.error("Error adding recent tx for %s: %s", user_id, e)
+    
+    async def record_transaction(
+        self,
+        user_id: str,
+        device_id: Optional[str],
+        lat: Optional[float],
+        lng: Optional[float],
+        timestamp: datetime,
+        tx_id: str,
+        amount: Optional[float] = None,
+        risk_result: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Record a processed transaction in one MULTI/EXEC round-trip.
+        Updates last known device/location (when provided), the
+        recent transaction window, the daily amount buckets, and the
+        cached risk result.
+        """
+        try:
+            async with self.client.pipeline(transaction=True) as pipe:
+                self._queue_record(
+                    pipe, user_id, device_id, lat, lng, timestamp, tx_id, amount, risk_result
+                )
+                await pipe.execute()
+        except Exception as e:
+            logger.error("Error recording tx for %s: %s", user_id, e)
+    
+    async def record_transactions(self, records: Sequence[Dict[str, Any]]):
+        """
+        Record many processed transactions in one MULTI/EXEC round-trip.
+        Each record holds record_transaction's keyword arguments, applied in order.
+        """
+        try:
+            async with self.client.pipeline(transaction=True) as pipe:
+                for record in records:
+                    self._queue_record(pipe, **record)
+                await pipe.execute()
+        except Exception as e:
+            logger.error("Error recording %d txs: %s", len(records), e)
+    
+    def _queue_record(
+        self,
+        pipe,
+        user_id: str,
+        device_id: Optional[str],
+        lat: Optional[float],
+        lng: Optional[float],
+        timestamp: datetime,
+        tx_id: str,
+        amount: Optional[float] = None,
+        risk_result: Optional[Dict[str, Any]] = None
+    ):
+        """Queue all cache updates for one processed transaction on a pipeline."""
+        if device_id or lat is not None:
+            key, payload = self._last_known_entry(
+                user_id, device_id or "", lat, lng, timestamp
+            )
+            pipe.setex(key, timedelta(days=30), payload)
+        self._queue_recent_transaction(pipe, user_id, timestamp, tx_id)
+        if amount is not None:
+            self._queue_amount_stats(pipe, user_id, amount, timestamp)
+        if risk_result is not None:
+            pipe.setex(
+                f"{self.RISK_RESULT_PREFIX}{tx_id}", self.RISK_RESULT_TTL, orjson.dumps(risk_result)
+            )
+    
+    async def get_risk_result(self, tx_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the cached risk result of an already processed transaction.
+        Returns None on a miss; the database remains the source of truth.
+        """
+        try:
+            data = await self.client.get(f"{self.RISK_RESULT_PREFIX}{tx_id}")
+            return orjson.loads(data) if data else None
+        except Exception as e:
+            logger.error("Error getting cached risk result for %s: %s", tx_id, e)
+            return None
+    
+    def _last_known_entry(
+        self,
+        user_id: str,
+        device_id: str,
+        lat: Optional[float],
+        lng: Optional[float],
+        timestamp: datetime
+    ) -> Tuple[str, bytes]:
+        """Build the last known key and its serialized payload."""
+        key = f"{self.LAST_KNOWN_PREFIX}{user_id}"
+        data = {
+            "device_id": device_id,
+            "lat": lat,
+            "lng": lng,
+            "last_ts": utc_epoch(timestamp)  # epoch seconds; no parsing on read
+        }
+        return key, orjson.dumps(data)
+    
+    def _queue_recent_transaction(self, pipe, user_id: str, timestamp: datetime, tx_id: str):
+        """Queue the recent transaction window updates on a pipeline."""
+        key = f"{self.RECENT_TX_PREFIX}{user_id}"
+        score = utc_epoch(timestamp)
+        # Store tx_id as member with timestamp as score
+        pipe.zadd(key, {tx_id: score})
+        # Clean up old entries (keep last 24 hours)
+        cutoff = time.time() - self.RECENT_TX_TTL
+        pipe.zremrangebyscore(key, "-inf", cutoff)
+        # Set expiry on the key
+        pipe.expire(key, self.RECENT_TX_TTL)
+    
+    def _queue_amount_stats(self, pipe, user_id: str, amount: float, timestamp: datetime):
+        """
+        Queue the daily amount bucket updates on a pipeline.
+        Buckets are hash fields "<epoch day>:s" (sum) and "<epoch day>:c" (count).
+        """
+        key = f"{self.AMOUNT_STATS_PREFIX}{user_id}"
+        today = self._epoch_day(time.time())
+        day = self._epoch_day(utc_epoch(timestamp))
+        if day >= today - self.AMOUNT_WINDOW_DAYS:
+            pipe.hincrbyfloat(key, f"{day}:s", amount)
+            pipe.hincrby(key, f"{day}:c", 1)
+        # Buckets older than the window; anything older still expired with the key
+        stale_days = range(today - 2 * self.AMOUNT_WINDOW_DAYS - 1, today - self.AMOUNT_WINDOW_DAYS)
+        pipe.hdel(key, *(f"{d}:{kind}" for d in stale_days for kind in "sc"))
+        pipe.expire(key, self.AMOUNT_STATS_TTL)
+    
+    @staticmethod
+    def _epoch_day(ts: float) -> int:
+        """Days since the Unix epoch for a POSIX timestamp."""
+        return int(ts // 86400)
+    
+    async def get_amount_stats(self, user_id: str, days: int = 30) -> Optional[Tuple[float, int]]:
+        """
+        Get (sum, count) of the user's transaction amounts over the last N days.
+        Returns None when the buckets were never built, so the caller can
+        rebuild them from the database.
+        """
+        try:
+            buckets = await self.client.hgetall(f"{self.AMOUNT_STATS_PREFIX}{user_id}")
+        except Exception as e:
+            logger.error("Error getting amount stats for %s: %s", user_id, e)
+            return None
+        
+        return self._sum_amount_buckets(buckets, days)
+    
+    def _sum_amount_buckets(self, buckets: Dict[str, str], days: int) -> Optional[Tuple[float, int]]:
+        """Sum the daily buckets inside the window; None if they were never built."""
+        if "built" not in buckets:
+            return None
+        
+        first_day = self._epoch_day(time.time()) - days
+        total, count = 0.0, 0
+        for field, value in buckets.items():
+            day, _, kind = field.partition(":")
+            if not kind or int(day) < first_day:
+                continue
+            if kind == "s":
+                total += float(value)
+            else:
+                count += int(value)
+        return total, count
+    
+    async def rebuild_amount_stats(self, user_id: str, history: Iterable[Tuple[float, datetime]]):
+        """Replace the user's daily amount buckets with (amount, timestamp) history."""
+        buckets: Dict[str, float] = {"built": 1}
+        for amount, timestamp in history:
+            day = self._epoch_day(utc_epoch(timestamp))
+            buckets[f"{day}:s"] = buckets.get(f"{day}:s", 0.0) + amount
+            buckets[f"{day}:c"] = buckets.get(f"{day}:c", 0) + 1
+        
+        key = f"{self.AMOUNT_STATS_PREFIX}{user_id}"
+        try:
+            async with self.client.pipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                pipe.hset(key, mapping=buckets)
+                pipe.expire(key, self.AMOUNT_STATS_TTL)
+                await pipe.execute()
         except Exception as e:
-            logger.error(f"Error adding recent tx for {user_id}: {e}")
+            logger.error("Error rebuilding amount stats for %s: %s", user_id, e)
     
-    def get_transaction_count_in_window(
+    async def fetch_scoring_context(
+        self,
+        user_id: str,
+        merchant_id: str,
+        amount: float,
+        velocity_windows: Tuple[int, int] = (60, 600),
+        duplicate_window: int = 30,
+        amount_days: int = 30
+    ) -> ScoringContext:
+        """
+        Fetch everything the scoring rules read from Redis in one pipeline:
+        both velocity window counts, last known device/location, the
+        duplicate SET NX, and the amount buckets.
+        """
+        contexts = await self.fetch_scoring_contexts(
+            [(user_id, merchant_id, amount)],
+            velocity_windows, duplicate_window, amount_days
+        )
+        return contexts[0]
+    
+    async def fetch_scoring_contexts(
+        self,
+        signatures: Sequence[Tuple[str, str, float]],
+        velocity_windows: Tuple[int, int] = (60, 600),
+        duplicate_window: int = 30,
+        amount_days: int = 30
+    ) -> List[ScoringContext]:
+        """
+        Fetch scoring contexts for many (user_id, merchant_id, amount)
+        signatures in one pipeline. Duplicate SET NX commands run in order,
+        so a repeat of an earlier signature in the same batch is a duplicate.
+        """
+        high_window, unusual_window = velocity_windows
+        now = time.time()
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for user_id, merchant_id, amount in signatures:
+                    recent_key = f"{self.RECENT_TX_PREFIX}{user_id}"
+                    pipe.zcount(recent_key, now - high_window, now)
+                    pipe.zcount(recent_key, now - unusual_window, now)
+                    pipe.get(f"{self.LAST_KNOWN_PREFIX}{user_id}")
+                    pipe.set(
+                        self._duplicate_key(user_id, merchant_id, amount),
+                        "1", nx=True, ex=duplicate_window
+                    )
+                    pipe.hgetall(f"{self.AMOUNT_STATS_PREFIX}{user_id}")
+                results = await pipe.execute()
+        except Exception as e:
+            logger.error("Error fetching scoring contexts for %d txs: %s", len(signatures), e)
+            return [ScoringContext() for _ in signatures]
+        
+        contexts = []
+        for i in range(0, len(results), 5):
+            count_high, count_unusual, last_known, created, buckets = results[i:i + 5]
+            contexts.append(ScoringContext(
+                count_high=count_high,
+                count_unusual=count_unusual,
+                last_known=orjson.loads(last_known) if last_known else None,
+                is_duplicate=created is None,
+                amount_stats=self._sum_amount_buckets(buckets, amount_days)
+            ))
+        return contexts
+    
+    async def get_transaction_count_in_window(
         self, 
         user_id: str, 
         window_seconds: int
@@ -110,14 +376,14 @@ class RedisClient:
         """
         try:
             key = f"{self.RECENT_TX_PREFIX}{user_id}"
-            now = datetime.utcnow().timestamp()
+            now = time.time()
             start = now - window_seconds
-            return self.client.zcount(key, start, now)
+            return await self.client.zcount(key, start, now)
         except Exception as e:
-            logger.error(f"Error getting tx count for {user_id}: {e}")
+            logger.error("Error getting tx count for %s: %s", user_id, e)
             return 0
     
-    def get_recent_transactions(
+    async def get_recent_transactions(
         self, 
         user_id: str, 
         window_seconds: int
@@ -125,15 +391,15 @@ class RedisClient:
         """Get recent transactions with their timestamps."""
         try:
             key = f"{self.RECENT_TX_PREFIX}{user_id}"
-            now = datetime.utcnow().timestamp()
+            now = time.time()
             start = now - window_seconds
             # Returns list of (tx_id, score) tuples
-            return self.client.zrangebyscore(key, start, now, withscores=True)
+            return await self.client.zrangebyscore(key, start, now, withscores=True)
         except Exception as e:
-            logger.error(f"Error getting recent txs for {user_id}: {e}")
+            logger.error("Error getting recent txs for %s: %s", user_id, e)
             return []
     
-    def check_duplicate_transaction(
+    async def check_duplicate_transaction(
         self, 
         user_id: str, 
         merchant_id: str, 
@@ -145,34 +411,53 @@ class RedisClient:
         Returns True if duplicate found.
         """
         try:
-            # Create a hash of the transaction signature
-            tx_hash = f"{user_id}:{merchant_id}:{amount}"
-            key = f"{self.TX_HASH_PREFIX}{tx_hash}"
-            
-            # Check if this exact combination exists
-            if self.client.exists(key):
-                return True
+            key = self._duplicate_key(user_id, merchant_id, amount)
             
-            # Store with short expiry for duplicate detection
-            self.client.setex(key, window_seconds, "1")
-            return False
+            # Atomic SET NX EX: only the first writer in the window succeeds,
+            # so concurrent identical transactions cannot both miss
+            created = await self.client.set(key, "1", nx=True, ex=window_seconds)
+            return created is None
         except Exception as e:
-            logger.error(f"Error checking duplicate tx: {e}")
+            logger.error("Error checking duplicate tx: %s", e)
             return False
     
-    def health_check(self) -> dict:
-        """Return Redis health status."""
+    def _duplicate_key(self, user_id: str, merchant_id: str, amount: float) -> str:
+        """
+        Duplicate-detection key: a fixed 8-byte BLAKE2b digest of the
+        transaction signature (amount in integer cents), so key size
+        doesn't grow with ID lengths.
+        """
+        signature = f"{user_id}|{merchant_id}|{round(amount * 100)}".encode()
+        digest = hashlib.blake2b(signature, digest_size=8).hexdigest()
+        return f"{self.TX_HASH_PREFIX}{digest}"
+    
+    async def health_check(self, force: bool = False) -> dict:
+        """
+        Return Redis health status.
+        The result is cached for HEALTH_TTL seconds so frequent load-balancer
+        probes cost at most one PING + INFO round-trip per window; force
+        skips the cache.
+        """
+        now = time.monotonic()
+        if not force and self._health_cache is not None and now - self._health_cache[0] < self.HEALTH_TTL:
+            return self._health_cache[1]
+        
         try:
-            if self.ping():
-                info = self.client.info("server")
-                return {
+            if await self.ping():
+                # One INFO call covers both the server and clients sections
+                info = await self.client.info()
+                health = {
                     "status": "healthy",
                     "redis_version": info.get("redis_version", "unknown"),
-                    "connected_clients": self.client.info("clients").get("connected_clients", 0)
+                    "connected_clients": info.get("connected_clients", 0)
                 }
-            return {"status": "unhealthy", "message": "Ping failed"}
+            else:
+                health = {"status": "unhealthy", "message": "Ping failed"}
         except Exception as e:
-            return {"status": "unhealthy", "message": str(e)}
+            health = {"status": "unhealthy", "message": str(e)}
+        
+        self._health_cache = (now, health)
+        return health
 
 
 # Singleton instance
@@ -8,7 +8,7 @@ from sqlalchemy import (
     Integer, JSON, Text, Index
 )
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 
 Base = declarative_base()
 
@@ -20,9 +20,9 @@ class User(Base):
     user_id = Column(String(50), primary_key=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     
-    # Relationships
-    transactions = relationship("Transaction", back_populates="user")
-    risk_logs = relationship("RiskLog", back_populates="user")
+    # Relationships - lazy="raise" forbids implicit loads; use selectinload()
+    transactions = relationship("Transaction", back_populates="user", lazy="raise")
+    risk_logs = relationship("RiskLog", back_populates="user", lazy="raise")
     
     def __repr__(self):
         return f"<User(user_id={self.user_id})>"
@@ -45,12 +45,16 @@ class Transaction(Base):
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     
     # Relationships
-    user = relationship("User", back_populates="transactions")
-    risk_log = relationship("RiskLog", back_populates="transaction", uselist=False)
+    user = relationship("User", back_populates="transactions", lazy="raise")
+    risk_log = relationship("RiskLog", back_populates="transaction", uselist=False, lazy="raise")
     
     # Indexes for common queries
     __table_args__ = (
-        Index("idx_user_timestamp", "user_id", "timestamp"),
+        # Covers the 30-day amount history lookup as an index-only scan
+        Index(
+            "idx_user_timestamp_amount", "user_id", timestamp.desc(),
+            postgresql_include=["amount"]
+        ),
         Index("idx_user_merchant_amount", "user_id", "merchant_id", "amount"),
     )
     
@@ -67,22 +71,27 @@ class RiskLog(Base):
         String(100), 
         ForeignKey("transactions.transaction_id"), 
         nullable=False,
-        unique=True,
-        index=True
+        unique=True
     )
     user_id = Column(String(50), ForeignKey("users.user_id"), nullable=False, index=True)
-    risk_score = Column(Integer, nullable=False, index=True)
+    risk_score = Column(Integer, nullable=False)
     reasons = Column(JSON, nullable=False, default=list)
-    raw_evidence = Column(JSON, nullable=True)
+    # Potentially large; only loaded when a query explicitly undefers it
+    raw_evidence = deferred(Column(JSON, nullable=True), raiseload=True)
     evaluated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     
     # Relationships
-    transaction = relationship("Transaction", back_populates="risk_log")
-    user = relationship("User", back_populates="risk_logs")
+    transaction = relationship("Transaction", back_populates="risk_log", lazy="raise")
+    user = relationship("User", back_populates="risk_logs", lazy="raise")
     
-    # Index for flagged transaction queries
     __table_args__ = (
-        Index("idx_risk_score", "risk_score"),
+        # Index matching the flagged transaction ORDER BY, so /flags is an index scan
+        Index("idx_risk_score_evaluated", risk_score.desc(), evaluated_at.desc()),
+        # Covers the idempotency lookup so it is an index-only scan
+        Index(
+            "idx_risk_txid_covering", "transaction_id",
+            postgresql_include=["risk_score", "reasons"]
+        ),
     )
     
     def __repr__(self):
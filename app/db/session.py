@@ -2,68 +2,216 @@
 Database session management.
 Provides async database connection and session handling.
 """
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import QueuePool
-from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from contextlib import asynccontextmanager
+import asyncio
 import logging
+import time
+
+from sqlalchemy import event, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 
 from app.config import settings
 from app.db.models import Base
 
 logger = logging.getLogger(__name__)
 
-# Create engine with connection pooling
-engine = create_engine(
-    settings.DATABASE_URL,
-    poolclass=QueuePool,
-    pool_size=10,
-    max_overflow=20,
+
+# Async driver used for each supported database backend
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+}
+
+
+def _async_database_url(url: str) -> Tuple[URL, Dict[str, Any]]:
+    """
+    Rewrite a configured database URL onto its async driver.
+    Returns the URL plus any connect_args the driver needs.
+    """
+    db_url = make_url(url.replace("postgres://", "postgresql://", 1))
+    backend = db_url.get_backend_name()
+    driver = ASYNC_DRIVERS.get(backend)
+    if driver is None:
+        raise ValueError(
+            f"Unsupported DATABASE_URL backend '{backend}'; "
+            f"expected one of: {', '.join(sorted(ASYNC_DRIVERS))}"
+        )
+    
+    connect_args: Dict[str, Any] = {}
+    if backend == "postgresql":
+        # asyncpg takes libpq's sslmode as its ``ssl`` connect argument
+        sslmode = db_url.query.get("sslmode")
+        if sslmode:
+            db_url = db_url.difference_update_query(["sslmode"])
+            connect_args["ssl"] = sslmode
+    
+    return db_url.set(drivername=f"{backend}+{driver}"), connect_args
+
+
+def _pool_options(db_url: URL) -> Dict[str, Any]:
+    """Queue pool sizing; SQLite keeps the dialect's default pool."""
+    if db_url.get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+
+
+DATABASE_URL, CONNECT_ARGS = _async_database_url(settings.DATABASE_URL)
+
+# Create async engine with connection pooling
+engine = create_async_engine(
+    DATABASE_URL,
+    connect_args=CONNECT_ARGS,
     pool_pre_ping=True,  # Verify connections before use
-    echo=settings.DEBUG
+    echo=settings.DEBUG,
+    **_pool_options(DATABASE_URL)
 )
 
+# Read replica engine for list/analytics queries; the primary when none is configured
+if settings.DATABASE_READ_URL:
+    READ_DATABASE_URL, READ_CONNECT_ARGS = _async_database_url(settings.DATABASE_READ_URL)
+    read_engine = create_async_engine(
+        READ_DATABASE_URL,
+        connect_args=READ_CONNECT_ARGS,
+        pool_pre_ping=True,
+        echo=settings.DEBUG,
+        **_pool_options(READ_DATABASE_URL)
+    )
+else:
+    read_engine = engine
+
+# Peak concurrent checkouts since startup, so pool saturation is visible
+pool_stats = {"checked_out_peak": 0}
+
+
+@event.listens_for(engine.sync_engine, "checkout")
+def _track_checkout(dbapi_conn, conn_record, conn_proxy):
+    checked_out = get_pool_status().get("checked_out", 0)
+    if checked_out > pool_stats["checked_out_peak"]:
+        pool_stats["checked_out_peak"] = checked_out
+
+
+def get_pool_status() -> dict:
+    """Current pool usage (queue pools only)."""
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {}
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "checked_out_peak": pool_stats["checked_out_peak"],
+    }
+
+
+# Seconds a database health snapshot is reused
+HEALTH_TTL = 5.0
+_health_cache: Optional[Tuple[float, dict]] = None
+
 # Session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = async_sessionmaker(
+    engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
 
+ReadSessionLocal = async_sessionmaker(
+    read_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
 
-def init_db():
+
+async def init_db():
     """Initialize database tables."""
     try:
-        Base.metadata.create_all(bind=engine)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
         logger.info("Database tables created successfully")
     except Exception as e:
-        logger.error(f"Failed to create database tables: {e}")
+        logger.error("Failed to create database tables: %s", e)
         raise
 
 
-def get_db() -> Session:
+async def warm_pool():
+    """
+    Pre-open pool_size connections at startup so the first requests
+    don't pay TCP/TLS and authentication handshakes.
+    """
+    size = _pool_options(DATABASE_URL).get("pool_size", 0)
+    conns = [engine.connect() for _ in range(size)]
+    try:
+        await asyncio.gather(*(conn.start() for conn in conns))
+        logger.info("Warmed %d database connections", size)
+    finally:
+        await asyncio.gather(*(conn.close() for conn in conns), return_exceptions=True)
+
+
+async def get_db() -> AsyncIterator[AsyncSession]:
     """
     Dependency for FastAPI routes.
     Yields a database session and ensures cleanup.
     """
-    db = SessionLocal()
-    try:
+    async with SessionLocal() as db:
+        yield db
+
+
+async def get_read_db() -> AsyncIterator[AsyncSession]:
+    """
+    Dependency for read-only routes that tolerate replica lag.
+    Yields a session on the read replica (the primary if none is configured).
+    """
+    async with ReadSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
-@contextmanager
-def get_db_context():
+@asynccontextmanager
+async def get_db_context() -> AsyncIterator[AsyncSession]:
     """Context manager for database sessions outside of FastAPI routes."""
-    db = SessionLocal()
-    try:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
-def check_db_health() -> dict:
-    """Check database connectivity and return health status."""
+def insert_ignore(db: AsyncSession, model):
+    """
+    Build an INSERT ... ON CONFLICT DO NOTHING for the session's dialect.
+    Lets idempotent rows (e.g. users) be created without a prior SELECT.
+    """
+    dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+    return dialect.insert(model).on_conflict_do_nothing()
+
+
+async def check_db_health(force: bool = False) -> dict:
+    """
+    Check database connectivity and return health status.
+    Cached for HEALTH_TTL seconds so health probes don't open a session each time;
+    force skips the cache (the background probe loop refreshes on its own cadence).
+    """
+    global _health_cache
+    now = time.monotonic()
+    if not force and _health_cache is not None and now - _health_cache[0] < HEALTH_TTL:
+        return _health_cache[1]
+    
     try:
-        with get_db_context() as db:
-            db.execute("SELECT 1")
-        return {"status": "healthy", "message": "Database connection successful"}
+        async with get_db_context() as db:
+            await db.execute(text("SELECT 1"))
+        health = {
+            "status": "healthy",
+            "message": "Database connection successful",
+            "pool": get_pool_status()
+        }
     except Exception as e:
-        return {"status": "unhealthy", "message": str(e)}
+        health = {"status": "unhealthy", "message": str(e)}
+    
+    _health_cache = (now, health)
+    return health
@@ -2,15 +2,18 @@
 FastAPI application entry point.
 Transaction Risk & Fraud Detection Engine
 """
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.openapi.utils import get_openapi
 
-from app.api.routes import router
-from app.db.session import init_db
+from app.api.routes import router, drain_cache_writes, probe_health, health_probe_loop
+from app.cache.redis_client import redis_client
+from app.db.session import init_db, warm_pool, engine, read_engine
 from app.config import settings
 
 # Configure logging
@@ -27,16 +30,27 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting Transaction Risk & Fraud Detection Engine...")
     try:
-        init_db()
+        await init_db()
+        await warm_pool()
         logger.info("Database initialized successfully")
     except Exception as e:
-        logger.error(f"Failed to initialize database: {e}")
+        logger.error("Failed to initialize database: %s", e)
         raise
     
+    # /health serves this snapshot; the probe task keeps it fresh
+    app.state.health = await probe_health(force=True)
+    health_probe = asyncio.create_task(health_probe_loop(app.state))
+    
     yield
     
     # Shutdown
     logger.info("Shutting down...")
+    health_probe.cancel()
+    await drain_cache_writes()
+    await redis_client.close()
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
 
 
 # Create FastAPI application
@@ -71,18 +85,20 @@ Transactions with score ≥50 are flagged for review.
     """,
     version=settings.APP_VERSION,
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     docs_url="/docs",
     redoc_url="/redoc",
     openapi_url="/openapi.json"
 )
 
-# Add CORS middleware
+# Add CORS middleware for the configured origins only; with credentials
+# allowed, a wildcard would let any site make authenticated calls
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=[origin.strip() for origin in settings.CORS_ORIGINS.split(",") if origin.strip()],
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST"],
+    allow_headers=["Content-Type", "Authorization"],
 )
 
 # Include API routes
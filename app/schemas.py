@@ -1,13 +1,16 @@
 """
 Pydantic schemas for request/response validation.
 """
-from datetime import datetime
+import sys
+from datetime import datetime, timezone
 from typing import Optional, Dict, Any, List
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 
 
 class LocationInput(BaseModel):
     """Location coordinates."""
+    model_config = ConfigDict(extra="forbid")
+    
     lat: float = Field(..., ge=-90, le=90, description="Latitude")
     lng: float = Field(..., ge=-180, le=180, description="Longitude")
 
@@ -24,8 +27,25 @@ class TransactionRequest(BaseModel):
     device_id: Optional[str] = Field(None, max_length=100)
     metadata: Optional[Dict[str, Any]] = None
     
-    model_config = {
-        "json_schema_extra": {
+    @field_validator("merchant_id")
+    @classmethod
+    def intern_merchant_id(cls, v: str) -> str:
+        """Intern merchant IDs: repeat merchants share one string object."""
+        return sys.intern(v)
+    
+    @field_validator("timestamp")
+    @classmethod
+    def timestamp_to_naive_utc(cls, v: datetime) -> datetime:
+        """
+        Store timestamps as naive UTC: the columns are TIMESTAMP without
+        time zone, and asyncpg rejects aware datetimes for them.
+        """
+        if v.tzinfo is not None:
+            v = v.astimezone(timezone.utc).replace(tzinfo=None)
+        return v
+    
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "transaction_id": "tx123",
                 "user_id": "u100",
@@ -38,11 +58,22 @@ class TransactionRequest(BaseModel):
                 "metadata": {"merchant_category": "travel", "channel": "nfc"}
             }
         }
-    }
+    )
+
+
+# Largest number of transactions accepted by POST /transactions/batch
+MAX_BATCH_SIZE = 1000
+
+
+class TransactionBatchRequest(BaseModel):
+    """Request schema for submitting several transactions at once."""
+    transactions: List[TransactionRequest] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
 
 
 class TransactionResponse(BaseModel):
     """Response schema for transaction processing result."""
+    model_config = ConfigDict(frozen=True)
+    
     transaction_id: str
     risk_score: int = Field(..., ge=0, le=100)
     risk_reasons: List[str]
@@ -62,6 +93,8 @@ class RiskDetailResponse(BaseModel):
 
 class FlaggedTransactionResponse(BaseModel):
     """Response for flagged transaction listing."""
+    model_config = ConfigDict(frozen=True)
+    
     transaction_id: str
     user_id: str
     amount: float
@@ -74,6 +107,8 @@ class FlaggedTransactionResponse(BaseModel):
 
 class HealthResponse(BaseModel):
     """Health check response."""
+    model_config = ConfigDict(frozen=True)
+    
     status: str
     database: Dict[str, Any]
     redis: Dict[str, Any]
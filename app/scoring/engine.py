@@ -2,27 +2,44 @@
 Fraud Scoring Engine - Core risk assessment logic.
 Implements all fraud detection rules and scoring.
 """
+import asyncio
+import bisect
 import math
 import logging
+import time
 from datetime import datetime, timedelta
-from typing import Tuple, List, Dict, Any, Optional
-from dataclasses import dataclass
+from typing import Tuple, List, Dict, Any, Optional, Sequence
+from dataclasses import dataclass, field, replace
 
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, bindparam
 
+from app.config import settings
 from app.db.models import Transaction
-from app.cache.redis_client import redis_client
+from app.cache.redis_client import redis_client, RedisClient, ScoringContext, utc_epoch
 
 logger = logging.getLogger(__name__)
 
-# Merchant blacklist - static list of known fraudulent merchants
+# Merchant blacklist - static list of known fraudulent merchants.
+# Request merchant IDs are interned at validation, so lookups of repeat
+# merchants hit their cached string hash.
 MERCHANT_BLACKLIST = frozenset(["m_blacklisted", "fraud_merchant"])
 
 
-@dataclass
+@dataclass(frozen=True)
 class TransactionInput:
-    """Input data for transaction evaluation."""
+    """
+    Input data for transaction evaluation.
+    Immutable and slotted (no per-instance __dict__); validation happens
+    in the request schemas before one is built.
+    """
+    # Declared by hand: dataclass(slots=True) needs Python 3.10
+    __slots__ = (
+        "transaction_id", "user_id", "amount", "currency", "merchant_id",
+        "timestamp", "location_lat", "location_lng", "device_id", "metadata",
+        "timestamp_epoch",
+    )
+    
     transaction_id: str
     user_id: str
     amount: float
@@ -33,6 +50,18 @@ class TransactionInput:
     location_lng: Optional[float]
     device_id: Optional[str]
     metadata: Optional[Dict[str, Any]]
+    
+    def __post_init__(self):
+        # Transaction time in UTC epoch seconds, for time arithmetic in rules
+        object.__setattr__(self, "timestamp_epoch", utc_epoch(self.timestamp))
+
+
+@dataclass
+class _RuleContext:
+    """Score, reasons and evidence accumulated by the rules for one transaction."""
+    score: int = 0
+    reasons: List[str] = field(default_factory=list)
+    evidence: Dict[str, Any] = field(default_factory=dict)
 
 
 @dataclass
@@ -44,6 +73,16 @@ class RiskResult:
     flagged: bool
 
 
+EARTH_RADIUS_KM = 6371.0
+_DEG2RAD = math.pi / 180.0
+
+# Module-level aliases: one global lookup per call instead of math.<name>
+_sin = math.sin
+_cos = math.cos
+_asin = math.asin
+_sqrt = math.sqrt
+
+
 def haversine_distance(
     lat1: float, lng1: float, 
     lat2: float, lng2: float
@@ -52,34 +91,122 @@ def haversine_distance(
     Calculate the great circle distance between two points on Earth.
     Returns distance in kilometers.
     """
-    R = 6371  # Earth's radius in kilometers
+    lat1_rad = lat1 * _DEG2RAD
+    lat2_rad = lat2 * _DEG2RAD
+    sin_dlat = _sin((lat2_rad - lat1_rad) * 0.5)
+    sin_dlng = _sin((lng2 - lng1) * _DEG2RAD * 0.5)
+    
+    a = (sin_dlat * sin_dlat + 
+         _cos(lat1_rad) * _cos(lat2_rad) * 
+         sin_dlng * sin_dlng)
+    # 2*asin(sqrt(a)) == 2*atan2(sqrt(a), sqrt(1-a)) with one fewer sqrt and trig call
+    return 2 * EARTH_RADIUS_KM * _asin(_sqrt(min(1.0, a)))
+
+
+def haversine_vector(
+    lat1: float, lng1: float,
+    points: Sequence[Tuple[float, float]]
+) -> List[float]:
+    """
+    Distances in kilometers from one origin to many (lat, lng) points.
+    The origin's radians and cosine are computed once for the whole batch.
+    """
+    lat1_rad = lat1 * _DEG2RAD
+    cos_lat1 = _cos(lat1_rad)
+    distances = []
+    for lat2, lng2 in points:
+        lat2_rad = lat2 * _DEG2RAD
+        sin_dlat = _sin((lat2_rad - lat1_rad) * 0.5)
+        sin_dlng = _sin((lng2 - lng1) * _DEG2RAD * 0.5)
+        a = sin_dlat * sin_dlat + cos_lat1 * _cos(lat2_rad) * sin_dlng * sin_dlng
+        distances.append(2 * EARTH_RADIUS_KM * _asin(_sqrt(min(1.0, a))))
+    return distances
+
+
+def equirectangular_distance(
+    lat1: float, lng1: float,
+    lat2: float, lng2: float
+) -> float:
+    """
+    Flat-Earth approximation of the distance in kilometers: one cos, one sqrt.
+    Within a fraction of a percent of haversine at a few hundred km,
+    but degrades over long distances and near the poles.
+    """
+    delta_lng = lng2 - lng1
+    # Take the short way around the antimeridian
+    if delta_lng > 180:
+        delta_lng -= 360
+    elif delta_lng < -180:
+        delta_lng += 360
     
-    lat1_rad = math.radians(lat1)
-    lat2_rad = math.radians(lat2)
-    delta_lat = math.radians(lat2 - lat1)
-    delta_lng = math.radians(lng2 - lng1)
+    x = delta_lng * _DEG2RAD * _cos((lat1 + lat2) * 0.5 * _DEG2RAD)
+    y = (lat2 - lat1) * _DEG2RAD
+    return EARTH_RADIUS_KM * _sqrt(x * x + y * y)
+
+
+# Amount history lookup, built once at import and reused with bound uid/cutoff.
+# Served by idx_user_timestamp_amount (amount is an included column).
+_AMOUNT_HISTORY_STMT = select(Transaction.amount, Transaction.timestamp).where(
+    Transaction.user_id == bindparam("uid"),
+    Transaction.timestamp >= bindparam("cutoff")
+)
+
+
+async def get_user_amount_history(
+    db: AsyncSession, user_id: str, days: int = 30
+) -> List[Tuple[float, datetime]]:
+    """
+    Fetch the user's (amount, timestamp) pairs over the last N days.
+    Used to rebuild the Redis amount buckets when they are missing.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=days)
     
-    a = (math.sin(delta_lat / 2) ** 2 + 
-         math.cos(lat1_rad) * math.cos(lat2_rad) * 
-         math.sin(delta_lng / 2) ** 2)
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    result = await db.execute(
+        _AMOUNT_HISTORY_STMT, {"uid": user_id, "cutoff": cutoff}
+    )
     
-    return R * c
+    return [(float(amount), timestamp) for amount, timestamp in result]
+
 
+# Amount history for many users at once (batch scoring), one IN query
+_USERS_AMOUNT_HISTORY_STMT = select(
+    Transaction.user_id, Transaction.amount, Transaction.timestamp
+).where(
+    Transaction.user_id.in_(bindparam("uids", expanding=True)),
+    Transaction.timestamp >= bindparam("cutoff")
+)
 
-def get_user_average_amount(db: Session, user_id: str, days: int = 30) -> Optional[float]:
+
+async def get_users_amount_history(
+    db: AsyncSession, user_ids: Sequence[str], days: int = 30
+) -> Dict[str, List[Tuple[float, datetime]]]:
     """
-    Calculate user's average transaction amount over the last N days.
-    Returns None if no transactions found.
+    Fetch (amount, timestamp) pairs over the last N days for several users
+    in one query. Every requested user gets an entry, empty if no history.
     """
     cutoff = datetime.utcnow() - timedelta(days=days)
+    history: Dict[str, List[Tuple[float, datetime]]] = {user_id: [] for user_id in user_ids}
     
-    result = db.query(func.avg(Transaction.amount)).filter(
-        Transaction.user_id == user_id,
-        Transaction.timestamp >= cutoff
-    ).scalar()
+    result = await db.execute(
+        _USERS_AMOUNT_HISTORY_STMT, {"uids": list(user_ids), "cutoff": cutoff}
+    )
+    for user_id, amount, timestamp in result:
+        history[user_id].append((float(amount), timestamp))
     
-    return float(result) if result else None
+    return history
+
+
+# Per-process cache of database-computed (sum, count) amount stats, keyed by
+# user_id. Absorbs concurrent Redis misses for hot users; entries live
+# AMOUNT_FALLBACK_TTL seconds and are dropped when the user's history changes.
+AMOUNT_FALLBACK_TTL = 1.0
+AMOUNT_FALLBACK_MAXSIZE = 10000
+_amount_fallback_cache: Dict[str, Tuple[float, Tuple[float, int]]] = {}
+
+
+def invalidate_amount_fallback(user_id: str) -> None:
+    """Drop a user's cached fallback stats (call after persisting their transaction)."""
+    _amount_fallback_cache.pop(user_id, None)
 
 
 class ScoringEngine:
@@ -91,6 +218,7 @@ class ScoringEngine:
     # Scoring constants
     AMOUNT_SPIKE_MULTIPLIER = 5.0
     AMOUNT_SPIKE_SCORE = 30
+    AMOUNT_SPIKE_DAYS = 30
     
     VELOCITY_HIGH_COUNT = 3
     VELOCITY_HIGH_WINDOW = 60  # seconds
@@ -103,6 +231,7 @@ class ScoringEngine:
     LOCATION_DISTANCE_THRESHOLD = 500  # km
     LOCATION_TIME_THRESHOLD = 12  # hours
     LOCATION_MISMATCH_SCORE = 20
+    LOCATION_EXACT_BAND = 0.2  # use exact haversine within ±20% of the distance threshold
     
     DEVICE_CHANGE_SCORE = 10
     
@@ -111,146 +240,209 @@ class ScoringEngine:
     DUPLICATE_WINDOW = 30  # seconds
     DUPLICATE_SCORE = 35
     
-    FLAG_THRESHOLD = 50
+    # Shared with the API's replay paths, which re-derive flagged from stored scores
+    FLAG_THRESHOLD = settings.FLAG_THRESHOLD
     
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
     
-    def evaluate_transaction(self, tx: TransactionInput) -> RiskResult:
+    async def evaluate_transaction(
+        self,
+        tx: TransactionInput,
+        context: Optional[ScoringContext] = None,
+        fast_flag: bool = False
+    ) -> RiskResult:
         """
         Main evaluation function - runs all checks and returns risk result.
+        Pass a prefetched context to skip the Redis fetch.
+        
+        With fast_flag, stops running rules as soon as the score reaches
+        FLAG_THRESHOLD (scores only increase, so flagged cannot flip back),
+        skipping the distance math and the amount spike rule's possible
+        database query. Reasons and evidence are then partial, so callers
+        that persist them must not set it.
         """
-        score = 0
-        reasons = []
-        evidence = {}
+        if context is None:
+            context = await fetch_scoring_context(tx)
         
-        # Run all checks
-        score, reasons, evidence = self._check_amount_spike(tx, score, reasons, evidence)
-        score, reasons, evidence = self._check_velocity(tx, score, reasons, evidence)
-        score, reasons, evidence = self._check_location_mismatch(tx, score, reasons, evidence)
-        score, reasons, evidence = self._check_device_change(tx, score, reasons, evidence)
-        score, reasons, evidence = self._check_merchant_blacklist(tx, score, reasons, evidence)
-        score, reasons, evidence = self._check_duplicate_transaction(tx, score, reasons, evidence)
+        # Run all checks; each rule adds to the shared accumulator in place.
+        # Cheapest first: lookups and comparisons, then the distance math,
+        # then the rule that may query the database.
+        acc = _RuleContext()
+        self._check_merchant_blacklist(tx, acc)
+        for rule in (
+            self._check_duplicate_transaction,
+            self._check_device_change,
+            self._check_velocity,
+            self._check_location_mismatch,
+        ):
+            if fast_flag and acc.score >= self.FLAG_THRESHOLD:
+                break
+            rule(tx, context, acc)
+        if not (fast_flag and acc.score >= self.FLAG_THRESHOLD):
+            await self._check_amount_spike(tx, context, acc)
         
         # Clamp score between 0-100
-        final_score = max(0, min(100, score))
+        final_score = max(0, min(100, acc.score))
         
         # Determine if flagged
         flagged = final_score >= self.FLAG_THRESHOLD
+        # Lazy %-formatting: nothing is rendered unless DEBUG is enabled
+        logger.debug(
+            "scored tx=%s user=%s score=%d reasons=%s",
+            tx.transaction_id, tx.user_id, final_score, acc.reasons
+        )
         
         return RiskResult(
             score=final_score,
-            reasons=reasons,
-            evidence=evidence,
+            reasons=acc.reasons,
+            evidence=acc.evidence,
             flagged=flagged
         )
     
-    def _check_amount_spike(
-        self, tx: TransactionInput, 
-        score: int, reasons: List[str], evidence: Dict
-    ) -> Tuple[int, List[str], Dict]:
+    async def _get_user_average_amount(
+        self, user_id: str, stats: Optional[Tuple[float, int]], days: int
+    ) -> Optional[float]:
+        """
+        User's average amount over the last N days from the Redis buckets.
+        On a miss, computes it from the database and rebuilds the buckets.
+        Returns None if no transactions found.
+        """
+        if stats is None:
+            stats = await self._amount_stats_from_db(user_id, days)
+        
+        total, count = stats
+        return total / count if count else None
+    
+    async def _amount_stats_from_db(self, user_id: str, days: int) -> Tuple[float, int]:
+        """
+        Compute (sum, count) from the database and rebuild the Redis buckets,
+        unless another request did so within AMOUNT_FALLBACK_TTL seconds.
+        """
+        now = time.monotonic()
+        cached = _amount_fallback_cache.get(user_id)
+        if cached is not None and now - cached[0] < AMOUNT_FALLBACK_TTL:
+            return cached[1]
+        
+        history = await get_user_amount_history(self.db, user_id, days=days)
+        await redis_client.rebuild_amount_stats(user_id, history)
+        stats = (sum(amount for amount, _ in history), len(history))
+        
+        if len(_amount_fallback_cache) >= AMOUNT_FALLBACK_MAXSIZE:
+            # Evict the oldest entry (dicts keep insertion order)
+            _amount_fallback_cache.pop(next(iter(_amount_fallback_cache)), None)
+        _amount_fallback_cache[user_id] = (now, stats)
+        return stats
+    
+    async def _check_amount_spike(
+        self, tx: TransactionInput, context: ScoringContext, acc: _RuleContext
+    ) -> None:
         """
         Rule 1: Amount Spike
         If amount > 5x average user amount (last 30 days) -> +30 score
         """
-        avg_amount = get_user_average_amount(self.db, tx.user_id, days=30)
+        avg_amount = await self._get_user_average_amount(
+            tx.user_id, context.amount_stats, days=self.AMOUNT_SPIKE_DAYS
+        )
         
         if avg_amount is not None and avg_amount > 0:
             threshold = avg_amount * self.AMOUNT_SPIKE_MULTIPLIER
             if tx.amount > threshold:
-                score += self.AMOUNT_SPIKE_SCORE
-                reasons.append("amount_spike")
-                evidence["amount_spike"] = {
+                acc.score += self.AMOUNT_SPIKE_SCORE
+                acc.reasons.append("amount_spike")
+                acc.evidence["amount_spike"] = {
                     "current_amount": tx.amount,
                     "average_amount": round(avg_amount, 2),
                     "threshold": round(threshold, 2),
                     "multiplier": round(tx.amount / avg_amount, 2)
                 }
         else:
-            evidence["amount_spike"] = {
+            acc.evidence["amount_spike"] = {
                 "status": "no_history",
                 "message": "No previous transactions to compare"
             }
-        
-        return score, reasons, evidence
     
     def _check_velocity(
-        self, tx: TransactionInput,
-        score: int, reasons: List[str], evidence: Dict
-    ) -> Tuple[int, List[str], Dict]:
+        self, tx: TransactionInput, context: ScoringContext, acc: _RuleContext
+    ) -> None:
         """
         Rule 2: Velocity Check
         - If ≥3 transactions in last 60 seconds -> +25 ("velocity_spike")
         - Else if ≥5 in last 10 minutes -> +15 ("velocity_unusual")
         """
-        # Check high velocity (60 seconds)
-        count_60s = redis_client.get_transaction_count_in_window(
-            tx.user_id, self.VELOCITY_HIGH_WINDOW
-        )
+        count_60s = context.count_high
+        count_10m = context.count_unusual
         
+        # Check high velocity (60 seconds)
         if count_60s >= self.VELOCITY_HIGH_COUNT:
-            score += self.VELOCITY_HIGH_SCORE
-            reasons.append("velocity_spike")
-            evidence["velocity"] = {
+            acc.score += self.VELOCITY_HIGH_SCORE
+            acc.reasons.append("velocity_spike")
+            acc.evidence["velocity"] = {
                 "type": "velocity_spike",
                 "count_60s": count_60s,
                 "threshold": self.VELOCITY_HIGH_COUNT
             }
         else:
             # Check unusual velocity (10 minutes)
-            count_10m = redis_client.get_transaction_count_in_window(
-                tx.user_id, self.VELOCITY_UNUSUAL_WINDOW
-            )
-            
             if count_10m >= self.VELOCITY_UNUSUAL_COUNT:
-                score += self.VELOCITY_UNUSUAL_SCORE
-                reasons.append("velocity_unusual")
-                evidence["velocity"] = {
+                acc.score += self.VELOCITY_UNUSUAL_SCORE
+                acc.reasons.append("velocity_unusual")
+                acc.evidence["velocity"] = {
                     "type": "velocity_unusual",
                     "count_10m": count_10m,
                     "threshold": self.VELOCITY_UNUSUAL_COUNT
                 }
             else:
-                evidence["velocity"] = {
+                acc.evidence["velocity"] = {
                     "status": "normal",
                     "count_60s": count_60s,
                     "count_10m": count_10m
                 }
-        
-        return score, reasons, evidence
     
     def _check_location_mismatch(
-        self, tx: TransactionInput,
-        score: int, reasons: List[str], evidence: Dict
-    ) -> Tuple[int, List[str], Dict]:
+        self, tx: TransactionInput, context: ScoringContext, acc: _RuleContext
+    ) -> None:
         """
         Rule 3: Location Mismatch
         If distance > 500 km AND time < 12 hours -> +20 ("location_mismatch")
         """
         if tx.location_lat is None or tx.location_lng is None:
-            evidence["location"] = {"status": "no_location_provided"}
-            return score, reasons, evidence
+            acc.evidence["location"] = {"status": "no_location_provided"}
+            return
         
-        last_known = redis_client.get_last_known(tx.user_id)
+        last_known = context.last_known
         
         if last_known and last_known.get("lat") and last_known.get("lng"):
             last_lat = last_known["lat"]
             last_lng = last_known["lng"]
-            last_timestamp = datetime.fromisoformat(last_known["last_timestamp"])
+            last_ts = last_known.get("last_ts")
+            if last_ts is None:
+                # Entries written before epoch timestamps (expire within 30 days)
+                last_ts = utc_epoch(datetime.fromisoformat(last_known["last_timestamp"]))
+            
+            # Calculate time difference in hours
+            time_diff = (tx.timestamp_epoch - last_ts) / 3600.0
             
-            # Calculate distance
-            distance = haversine_distance(
+            # Cheap approximation first; exact haversine only when it is close
+            # to the threshold, or for the evidence of an actual mismatch
+            distance = equirectangular_distance(
                 last_lat, last_lng,
                 tx.location_lat, tx.location_lng
             )
-            
-            # Calculate time difference in hours
-            time_diff = (tx.timestamp - last_timestamp).total_seconds() / 3600
+            band = self.LOCATION_DISTANCE_THRESHOLD * self.LOCATION_EXACT_BAND
+            if distance >= self.LOCATION_DISTANCE_THRESHOLD - band and (
+                distance <= self.LOCATION_DISTANCE_THRESHOLD + band
+                or time_diff < self.LOCATION_TIME_THRESHOLD
+            ):
+                distance = haversine_distance(
+                    last_lat, last_lng,
+                    tx.location_lat, tx.location_lng
+                )
             
             if distance > self.LOCATION_DISTANCE_THRESHOLD and time_diff < self.LOCATION_TIME_THRESHOLD:
-                score += self.LOCATION_MISMATCH_SCORE
-                reasons.append("location_mismatch")
-                evidence["location"] = {
+                acc.score += self.LOCATION_MISMATCH_SCORE
+                acc.reasons.append("location_mismatch")
+                acc.evidence["location"] = {
                     "type": "mismatch",
                     "distance_km": round(distance, 2),
                     "time_diff_hours": round(time_diff, 2),
@@ -258,111 +450,184 @@ class ScoringEngine:
                     "current_location": {"lat": tx.location_lat, "lng": tx.location_lng}
                 }
             else:
-                evidence["location"] = {
+                acc.evidence["location"] = {
                     "status": "normal",
                     "distance_km": round(distance, 2),
                     "time_diff_hours": round(time_diff, 2)
                 }
         else:
-            evidence["location"] = {"status": "no_previous_location"}
-        
-        return score, reasons, evidence
+            acc.evidence["location"] = {"status": "no_previous_location"}
     
     def _check_device_change(
-        self, tx: TransactionInput,
-        score: int, reasons: List[str], evidence: Dict
-    ) -> Tuple[int, List[str], Dict]:
+        self, tx: TransactionInput, context: ScoringContext, acc: _RuleContext
+    ) -> None:
         """
         Rule 4: Device Change
         If device_id != last known device -> +10 ("device_change")
         """
         if tx.device_id is None:
-            evidence["device"] = {"status": "no_device_provided"}
-            return score, reasons, evidence
+            acc.evidence["device"] = {"status": "no_device_provided"}
+            return
         
-        last_known = redis_client.get_last_known(tx.user_id)
+        last_known = context.last_known
         
         if last_known and last_known.get("device_id"):
             last_device = last_known["device_id"]
             
             if tx.device_id != last_device:
-                score += self.DEVICE_CHANGE_SCORE
-                reasons.append("device_change")
-                evidence["device"] = {
+                acc.score += self.DEVICE_CHANGE_SCORE
+                acc.reasons.append("device_change")
+                acc.evidence["device"] = {
                     "type": "changed",
                     "previous_device": last_device,
                     "current_device": tx.device_id
                 }
             else:
-                evidence["device"] = {
+                acc.evidence["device"] = {
                     "status": "same_device",
                     "device_id": tx.device_id
                 }
         else:
-            evidence["device"] = {"status": "first_device", "device_id": tx.device_id}
-        
-        return score, reasons, evidence
+            acc.evidence["device"] = {"status": "first_device", "device_id": tx.device_id}
     
     def _check_merchant_blacklist(
-        self, tx: TransactionInput,
-        score: int, reasons: List[str], evidence: Dict
-    ) -> Tuple[int, List[str], Dict]:
+        self, tx: TransactionInput, acc: _RuleContext
+    ) -> None:
         """
         Rule 5: Merchant Blacklist
         If merchant in blacklist -> +40 ("merchant_blacklist")
         """
         if tx.merchant_id in MERCHANT_BLACKLIST:
-            score += self.MERCHANT_BLACKLIST_SCORE
-            reasons.append("merchant_blacklist")
-            evidence["merchant"] = {
+            acc.score += self.MERCHANT_BLACKLIST_SCORE
+            acc.reasons.append("merchant_blacklist")
+            acc.evidence["merchant"] = {
                 "type": "blacklisted",
                 "merchant_id": tx.merchant_id
             }
         else:
-            evidence["merchant"] = {
+            acc.evidence["merchant"] = {
                 "status": "not_blacklisted",
                 "merchant_id": tx.merchant_id
             }
-        
-        return score, reasons, evidence
     
     def _check_duplicate_transaction(
-        self, tx: TransactionInput,
-        score: int, reasons: List[str], evidence: Dict
-    ) -> Tuple[int, List[str], Dict]:
+        self, tx: TransactionInput, context: ScoringContext, acc: _RuleContext
+    ) -> None:
         """
         Rule 6: Duplicate Transaction
         Same amount + merchant within last 30s -> +35 ("duplicate_transaction")
         """
-        is_duplicate = redis_client.check_duplicate_transaction(
-            tx.user_id,
-            tx.merchant_id,
-            tx.amount,
-            self.DUPLICATE_WINDOW
-        )
-        
-        if is_duplicate:
-            score += self.DUPLICATE_SCORE
-            reasons.append("duplicate_transaction")
-            evidence["duplicate"] = {
+        if context.is_duplicate:
+            acc.score += self.DUPLICATE_SCORE
+            acc.reasons.append("duplicate_transaction")
+            acc.evidence["duplicate"] = {
                 "type": "detected",
                 "window_seconds": self.DUPLICATE_WINDOW,
                 "merchant_id": tx.merchant_id,
                 "amount": tx.amount
             }
         else:
-            evidence["duplicate"] = {"status": "not_duplicate"}
-        
-        return score, reasons, evidence
+            acc.evidence["duplicate"] = {"status": "not_duplicate"}
+
+
+async def fetch_scoring_context(tx: TransactionInput) -> ScoringContext:
+    """
+    Fetch the Redis inputs for every rule in one round-trip.
+    Callers can overlap this with other I/O and pass the result to evaluate_transaction.
+    """
+    return await redis_client.fetch_scoring_context(
+        tx.user_id, tx.merchant_id, tx.amount,
+        velocity_windows=(ScoringEngine.VELOCITY_HIGH_WINDOW, ScoringEngine.VELOCITY_UNUSUAL_WINDOW),
+        duplicate_window=ScoringEngine.DUPLICATE_WINDOW,
+        amount_days=ScoringEngine.AMOUNT_SPIKE_DAYS
+    )
 
 
-def evaluate_transaction(
+async def fetch_scoring_contexts(txs: Sequence[TransactionInput]) -> List[ScoringContext]:
+    """Fetch the Redis inputs for a batch of transactions in one round-trip."""
+    return await redis_client.fetch_scoring_contexts(
+        [(tx.user_id, tx.merchant_id, tx.amount) for tx in txs],
+        velocity_windows=(ScoringEngine.VELOCITY_HIGH_WINDOW, ScoringEngine.VELOCITY_UNUSUAL_WINDOW),
+        duplicate_window=ScoringEngine.DUPLICATE_WINDOW,
+        amount_days=ScoringEngine.AMOUNT_SPIKE_DAYS
+    )
+
+
+async def evaluate_transaction(
     tx_input: TransactionInput,
-    db: Session
+    db: AsyncSession,
+    context: Optional[ScoringContext] = None,
+    fast_flag: bool = False
 ) -> RiskResult:
     """
     Convenience function to evaluate a transaction.
     Creates engine and runs evaluation.
     """
     engine = ScoringEngine(db)
-    return engine.evaluate_transaction(tx_input)
+    return await engine.evaluate_transaction(tx_input, context, fast_flag)
+
+
+async def evaluate_transactions(
+    txs: Sequence[TransactionInput],
+    db: AsyncSession,
+    contexts: Sequence[ScoringContext]
+) -> List[RiskResult]:
+    """
+    Evaluate a batch in order, as if each transaction had been sent on its own.
+    Contexts hold Redis state from before the batch; each transaction also
+    sees the earlier same-user entries of the batch in its velocity counts,
+    last known device/location and amount stats.
+    
+    Users whose amount buckets are missing have their history loaded in
+    one query (and their buckets rebuilt) instead of one query per user.
+    """
+    engine = ScoringEngine(db)
+    high_window = ScoringEngine.VELOCITY_HIGH_WINDOW
+    unusual_window = ScoringEngine.VELOCITY_UNUSUAL_WINDOW
+    
+    # Per-user running state: (sum, count) amount stats, last known entry,
+    # and sorted epoch times of the user's earlier batch transactions
+    amount_stats: Dict[str, Optional[Tuple[float, int]]] = {}
+    last_known: Dict[str, Dict[str, Any]] = {}
+    batch_times: Dict[str, List[float]] = {}
+    
+    missing = {tx.user_id for tx, context in zip(txs, contexts) if context.amount_stats is None}
+    if missing:
+        history = await get_users_amount_history(db, missing, days=ScoringEngine.AMOUNT_SPIKE_DAYS)
+        await asyncio.gather(*(
+            redis_client.rebuild_amount_stats(user_id, user_history)
+            for user_id, user_history in history.items()
+        ))
+        for user_id, user_history in history.items():
+            amount_stats[user_id] = (sum(amount for amount, _ in user_history), len(user_history))
+    
+    now = time.time()
+    first_day = RedisClient._epoch_day(now) - ScoringEngine.AMOUNT_SPIKE_DAYS
+    results = []
+    for tx, context in zip(txs, contexts):
+        user_id = tx.user_id
+        times = batch_times.setdefault(user_id, [])
+        stats = amount_stats.setdefault(user_id, context.amount_stats)
+        in_window = bisect.bisect_right(times, now)
+        context = replace(
+            context,
+            count_high=context.count_high + in_window - bisect.bisect_left(times, now - high_window),
+            count_unusual=context.count_unusual + in_window - bisect.bisect_left(times, now - unusual_window),
+            last_known=last_known.get(user_id, context.last_known),
+            amount_stats=stats
+        )
+        results.append(await engine.evaluate_transaction(tx, context))
+        
+        # Record this transaction the way the cache write would
+        bisect.insort(times, tx.timestamp_epoch)
+        if tx.device_id or tx.location_lat is not None:
+            last_known[user_id] = {
+                "device_id": tx.device_id or "",
+                "lat": tx.location_lat,
+                "lng": tx.location_lng,
+                "last_ts": tx.timestamp_epoch
+            }
+        if stats is not None and RedisClient._epoch_day(tx.timestamp_epoch) >= first_day:
+            amount_stats[user_id] = (stats[0] + tx.amount, stats[1] + 1)
+    
+    return results
@@ -4,40 +4,64 @@ PyTest configuration and fixtures.
 import pytest
 from datetime import datetime, timedelta
 from unittest.mock import MagicMock, patch
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.pool import StaticPool
 
-from fastapi.testclient import TestClient
+from httpx import AsyncClient, ASGITransport
 
 from app.main import app
 from app.db.models import Base, User, Transaction
-from app.db.session import get_db
-from app.cache.redis_client import RedisClient
+from app.db.session import get_db, get_read_db
+from app.cache.redis_client import RedisClient, ScoringContext
+from app.scoring.engine import _amount_fallback_cache
 
 
 # Test database (in-memory SQLite)
-SQLALCHEMY_TEST_DATABASE_URL = "sqlite:///:memory:"
+SQLALCHEMY_TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
 
-engine = create_engine(
+engine = create_async_engine(
     SQLALCHEMY_TEST_DATABASE_URL,
     connect_args={"check_same_thread": False},
     poolclass=StaticPool,
 )
 
-TestSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+TestSessionLocal = async_sessionmaker(
+    engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
 
 
 @pytest.fixture(scope="function")
-def db_session():
+async def db_session():
     """Create a fresh database session for each test."""
-    Base.metadata.create_all(bind=engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
     session = TestSessionLocal()
     try:
         yield session
     finally:
-        session.close()
-        Base.metadata.drop_all(bind=engine)
+        await session.close()
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        # Cached fallback amount stats describe the dropped rows
+        _amount_fallback_cache.clear()
+        # Each test runs on its own event loop; drop the pooled connection
+        await engine.dispose()
+
+
+@pytest.fixture(scope="function")
+def count_queries():
+    """Record SQL statements executed on the test engine."""
+    statements = []
+    
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
 
 
 @pytest.fixture(scope="function")
@@ -48,6 +72,11 @@ def mock_redis():
     # Default mock returns
     mock_client.ping.return_value = True
     mock_client.get_last_known.return_value = None
+    mock_client.get_risk_result.return_value = None
+    mock_client.fetch_scoring_context.return_value = ScoringContext()
+    mock_client.fetch_scoring_contexts.side_effect = (
+        lambda signatures, *args, **kwargs: [ScoringContext() for _ in signatures]
+    )
     mock_client.get_transaction_count_in_window.return_value = 0
     mock_client.check_duplicate_transaction.return_value = False
     mock_client.health_check.return_value = {"status": "healthy"}
@@ -56,55 +85,63 @@ def mock_redis():
 
 
 @pytest.fixture(scope="function")
-def client(db_session, mock_redis):
+def engine_redis(mock_redis, monkeypatch):
+    """Install mock_redis as the scoring engine's Redis client."""
+    monkeypatch.setattr("app.scoring.engine.redis_client", mock_redis)
+    return mock_redis
+
+
+@pytest.fixture(scope="function")
+async def client(db_session, mock_redis):
     """Create test client with mocked dependencies."""
-    def override_get_db():
+    async def override_get_db():
         try:
             yield db_session
         finally:
             pass
     
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
     
     with patch("app.api.routes.redis_client", mock_redis):
         with patch("app.scoring.engine.redis_client", mock_redis):
-            with TestClient(app) as test_client:
+            transport = ASGITransport(app=app)
+            async with AsyncClient(transport=transport, base_url="http://test") as test_client:
                 yield test_client
     
     app.dependency_overrides.clear()
 
 
 @pytest.fixture
-def sample_user(db_session):
+async def sample_user(db_session):
     """Create a sample user."""
     user = User(user_id="test_user")
     db_session.add(user)
-    db_session.commit()
+    await db_session.commit()
     return user
 
 
 @pytest.fixture
-def sample_transactions(db_session, sample_user):
-    """Create sample historical transactions."""
-    transactions = []
+async def sample_transactions(db_session, sample_user):
+    """Create sample historical transactions (one executemany INSERT)."""
     base_time = datetime.utcnow() - timedelta(days=15)
+    transactions = [
+        {
+            "transaction_id": f"hist_tx_{i}",
+            "user_id": sample_user.user_id,
+            "amount": 100.0,  # Average of 100
+            "currency": "INR",
+            "merchant_id": "m_normal",
+            "timestamp": base_time + timedelta(days=i),
+            "location_lat": 12.9716,
+            "location_lng": 77.5946,
+            "device_id": "dev_1"
+        }
+        for i in range(10)
+    ]
     
-    for i in range(10):
-        tx = Transaction(
-            transaction_id=f"hist_tx_{i}",
-            user_id=sample_user.user_id,
-            amount=100.0,  # Average of 100
-            currency="INR",
-            merchant_id="m_normal",
-            timestamp=base_time + timedelta(days=i),
-            location_lat=12.9716,
-            location_lng=77.5946,
-            device_id="dev_1"
-        )
-        transactions.append(tx)
-        db_session.add(tx)
-    
-    db_session.commit()
+    await db_session.execute(insert(Transaction), transactions)
+    await db_session.commit()
     return transactions
 
 
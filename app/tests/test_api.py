@@ -2,16 +2,20 @@
 Integration tests for API endpoints.
 """
 import pytest
+import time
 from datetime import datetime, timedelta
-from unittest.mock import patch
+from unittest.mock import patch, MagicMock, AsyncMock
+from sqlalchemy import select, inspect
+
+from app.cache.redis_client import RedisClient, utc_epoch
 
 
 class TestPostTransactions:
     """Test POST /transactions endpoint."""
     
-    def test_process_transaction_success(self, client, base_transaction_request):
+    async def test_process_transaction_success(self, client, base_transaction_request):
         """Test successful transaction processing."""
-        response = client.post("/transactions", json=base_transaction_request)
+        response = await client.post("/transactions", json=base_transaction_request)
         
         assert response.status_code == 200
         data = response.json()
@@ -21,53 +25,191 @@ class TestPostTransactions:
         assert "flagged" in data
         assert 0 <= data["risk_score"] <= 100
     
-    def test_process_transaction_idempotency(self, client, base_transaction_request):
+    async def test_process_transaction_idempotency(self, client, base_transaction_request):
         """Test that same transaction returns same result."""
-        response1 = client.post("/transactions", json=base_transaction_request)
-        response2 = client.post("/transactions", json=base_transaction_request)
+        response1 = await client.post("/transactions", json=base_transaction_request)
+        response2 = await client.post("/transactions", json=base_transaction_request)
         
         assert response1.status_code == 200
         assert response2.status_code == 200
         assert response1.json() == response2.json()
     
-    def test_process_transaction_invalid_amount(self, client, base_transaction_request):
+    async def test_process_transaction_replay_from_cache(
+        self, client, base_transaction_request, mock_redis, count_queries
+    ):
+        """Test a cached risk result is returned without scoring or querying."""
+        mock_redis.get_risk_result.return_value = {
+            "risk_score": 75, "risk_reasons": ["merchant_blacklist"], "flagged": True
+        }
+        
+        response = await client.post("/transactions", json=base_transaction_request)
+        
+        assert response.status_code == 200
+        assert response.json()["risk_score"] == 75
+        assert count_queries == []
+        mock_redis.fetch_scoring_context.assert_not_called()
+    
+    async def test_process_transaction_existing_user(self, client, base_transaction_request):
+        """Test a second transaction for the same user reuses the user row."""
+        response1 = await client.post("/transactions", json=base_transaction_request)
+        base_transaction_request["transaction_id"] = "tx_test_002"
+        response2 = await client.post("/transactions", json=base_transaction_request)
+        
+        assert response1.status_code == 200
+        assert response2.status_code == 200
+        assert response2.json()["transaction_id"] == "tx_test_002"
+    
+    async def test_process_transaction_amount_spike_excludes_current(
+        self, client, base_transaction_request, sample_transactions
+    ):
+        """Test the spike average is taken over history, not the scored amount."""
+        base_transaction_request["amount"] = 600.0  # 6x the historical average of 100
+        response = await client.post("/transactions", json=base_transaction_request)
+        
+        assert response.status_code == 200
+        assert "amount_spike" in response.json()["risk_reasons"]
+    
+    async def test_process_transaction_invalid_amount(self, client, base_transaction_request):
         """Test validation for negative amount."""
         base_transaction_request["amount"] = -100.0
-        response = client.post("/transactions", json=base_transaction_request)
+        response = await client.post("/transactions", json=base_transaction_request)
         
         assert response.status_code == 422  # Validation error
     
-    def test_process_transaction_missing_required_field(self, client):
+    async def test_process_transaction_missing_required_field(self, client):
         """Test validation for missing required field."""
-        response = client.post("/transactions", json={"transaction_id": "test"})
+        response = await client.post("/transactions", json={"transaction_id": "test"})
         
         assert response.status_code == 422
     
-    def test_process_transaction_without_location(self, client, base_transaction_request):
+    async def test_process_transaction_without_location(self, client, base_transaction_request):
         """Test transaction without location data."""
         del base_transaction_request["location"]
-        response = client.post("/transactions", json=base_transaction_request)
+        response = await client.post("/transactions", json=base_transaction_request)
         
         assert response.status_code == 200
     
-    def test_process_transaction_without_device(self, client, base_transaction_request):
+    def test_merchant_id_interned(self, base_transaction_request):
+        """Test merchant IDs from separate requests share one string object."""
+        from app.schemas import TransactionRequest
+        
+        merchant_id = base_transaction_request["merchant_id"]
+        first = TransactionRequest(**dict(base_transaction_request, merchant_id="".join(merchant_id)))
+        second = TransactionRequest(**dict(base_transaction_request, merchant_id="".join(list(merchant_id))))
+        
+        assert first.merchant_id is second.merchant_id
+    
+    async def test_process_transaction_location_extra_field(self, client, base_transaction_request):
+        """Test unknown location keys are rejected."""
+        base_transaction_request["location"]["alt"] = 920.0
+        response = await client.post("/transactions", json=base_transaction_request)
+        
+        assert response.status_code == 422
+    
+    async def test_process_transaction_without_device(self, client, base_transaction_request):
         """Test transaction without device data."""
         del base_transaction_request["device_id"]
-        response = client.post("/transactions", json=base_transaction_request)
+        response = await client.post("/transactions", json=base_transaction_request)
+        
+        assert response.status_code == 200
+
+
+class TestPostTransactionBatch:
+    """Test POST /transactions/batch endpoint."""
+    
+    def _batch(self, base_transaction_request, count):
+        return [
+            dict(base_transaction_request, transaction_id=f"tx_batch_{i}", amount=100.0 + i)
+            for i in range(count)
+        ]
+    
+    async def test_batch_scores_in_request_order(self, client, base_transaction_request, mock_redis):
+        """Test each transaction is scored and returned in request order."""
+        transactions = self._batch(base_transaction_request, 3)
+        
+        response = await client.post("/transactions/batch", json={"transactions": transactions})
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert [d["transaction_id"] for d in data] == ["tx_batch_0", "tx_batch_1", "tx_batch_2"]
+        mock_redis.fetch_scoring_contexts.assert_called_once()
+        mock_redis.record_transactions.assert_called_once()
+    
+    async def test_batch_persists_rows(self, client, db_session, base_transaction_request):
+        """Test every new transaction and its risk log are stored."""
+        from app.db.models import Transaction, RiskLog
+        
+        await client.post(
+            "/transactions/batch",
+            json={"transactions": self._batch(base_transaction_request, 3)}
+        )
+        
+        tx_count = len((await db_session.execute(select(Transaction))).all())
+        log_count = len((await db_session.execute(select(RiskLog))).all())
+        assert tx_count == log_count == 3
+    
+    async def test_batch_reuses_existing_and_repeated_ids(self, client, base_transaction_request):
+        """Test already-processed and repeated IDs return the stored result."""
+        single = await client.post("/transactions", json=base_transaction_request)
+        transactions = [base_transaction_request] + self._batch(base_transaction_request, 1) * 2
+        
+        response = await client.post("/transactions/batch", json={"transactions": transactions})
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data[0] == single.json()
+        assert data[1] == data[2]
+    
+    async def test_batch_sees_earlier_batch_entries(self, client, base_transaction_request):
+        """Test velocity and device rules count earlier same-user entries of the batch."""
+        transactions = self._batch(base_transaction_request, 4)
+        transactions[3]["device_id"] = "dev_2"
+        
+        response = await client.post("/transactions/batch", json={"transactions": transactions})
+        
+        reasons = [d["risk_reasons"] for d in response.json()]
+        assert "velocity_spike" not in reasons[2]
+        assert "velocity_spike" in reasons[3]
+        assert "device_change" not in reasons[2]
+        assert "device_change" in reasons[3]
+    
+    async def test_batch_loads_missing_amount_history_once(
+        self, client, base_transaction_request, mock_redis, count_queries
+    ):
+        """Test users with missing amount buckets share one history query."""
+        transactions = [
+            dict(base_transaction_request, transaction_id=f"tx_user_{i}", user_id=f"user_{i}")
+            for i in range(3)
+        ]
+        
+        count_queries.clear()
+        response = await client.post("/transactions/batch", json={"transactions": transactions})
         
         assert response.status_code == 200
+        history_queries = [
+            q for q in count_queries
+            if q.lstrip().startswith("SELECT") and "FROM transactions" in q
+        ]
+        assert len(history_queries) == 1
+        assert mock_redis.rebuild_amount_stats.await_count == 3
+    
+    async def test_batch_rejects_empty(self, client):
+        """Test an empty batch is a validation error."""
+        response = await client.post("/transactions/batch", json={"transactions": []})
+        
+        assert response.status_code == 422
 
 
 class TestGetRisk:
     """Test GET /risk/{transaction_id} endpoint."""
     
-    def test_get_risk_success(self, client, base_transaction_request):
+    async def test_get_risk_success(self, client, base_transaction_request):
         """Test retrieving risk evaluation."""
         # First create a transaction
-        client.post("/transactions", json=base_transaction_request)
+        await client.post("/transactions", json=base_transaction_request)
         
         # Then retrieve its risk
-        response = client.get(f"/risk/{base_transaction_request['transaction_id']}")
+        response = await client.get(f"/risk/{base_transaction_request['transaction_id']}")
         
         assert response.status_code == 200
         data = response.json()
@@ -77,9 +219,9 @@ class TestGetRisk:
         assert "raw_evidence" in data
         assert "evaluated_at" in data
     
-    def test_get_risk_not_found(self, client):
+    async def test_get_risk_not_found(self, client):
         """Test 404 for non-existent transaction."""
-        response = client.get("/risk/non_existent_tx")
+        response = await client.get("/risk/non_existent_tx")
         
         assert response.status_code == 404
 
@@ -87,38 +229,68 @@ class TestGetRisk:
 class TestGetFlags:
     """Test GET /flags endpoint."""
     
-    def test_get_flags_empty(self, client):
+    async def test_get_flags_empty(self, client):
         """Test empty flags list."""
-        response = client.get("/flags")
+        response = await client.get("/flags")
         
         assert response.status_code == 200
         assert response.json() == []
     
-    def test_get_flags_with_min_score(self, client, base_transaction_request, mock_redis):
+    async def test_get_flags_with_min_score(self, client, base_transaction_request, mock_redis):
         """Test filtering by minimum score."""
         # Create a transaction with blacklisted merchant for high score
         base_transaction_request["merchant_id"] = "m_blacklisted"
         base_transaction_request["transaction_id"] = "tx_flagged"
         
-        client.post("/transactions", json=base_transaction_request)
+        await client.post("/transactions", json=base_transaction_request)
         
         # Query with min_score
-        response = client.get("/flags?min_score=40")
+        response = await client.get("/flags?min_score=40")
         
         assert response.status_code == 200
         data = response.json()
         assert len(data) >= 0  # May or may not be flagged depending on score
     
-    def test_get_flags_with_limit(self, client):
+    async def test_get_flags_returns_transaction_fields(self, client, base_transaction_request):
+        """Test flagged rows combine risk log and transaction columns."""
+        base_transaction_request["merchant_id"] = "m_blacklisted"
+        await client.post("/transactions", json=base_transaction_request)
+        
+        response = await client.get("/flags?min_score=40")
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data) == 1
+        assert data[0]["transaction_id"] == base_transaction_request["transaction_id"]
+        assert data[0]["merchant_id"] == "m_blacklisted"
+        assert data[0]["amount"] == base_transaction_request["amount"]
+        assert "merchant_blacklist" in data[0]["risk_reasons"]
+    
+    async def test_get_flags_statement_count(self, client, base_transaction_request, count_queries):
+        """Test /flags loads all rows without per-row lazy loads."""
+        base_transaction_request["merchant_id"] = "m_blacklisted"
+        for i in range(3):
+            base_transaction_request["transaction_id"] = f"tx_flag_{i}"
+            base_transaction_request["amount"] = 100.0 + i
+            await client.post("/transactions", json=base_transaction_request)
+        count_queries.clear()
+        
+        response = await client.get("/flags?min_score=40")
+        
+        assert response.status_code == 200
+        assert len(response.json()) == 3
+        assert len(count_queries) <= 2
+    
+    async def test_get_flags_with_limit(self, client):
         """Test limit parameter."""
-        response = client.get("/flags?limit=10")
+        response = await client.get("/flags?limit=10")
         
         assert response.status_code == 200
         assert len(response.json()) <= 10
     
-    def test_get_flags_invalid_min_score(self, client):
+    async def test_get_flags_invalid_min_score(self, client):
         """Test validation for invalid min_score."""
-        response = client.get("/flags?min_score=150")
+        response = await client.get("/flags?min_score=150")
         
         assert response.status_code == 422
 
@@ -126,9 +298,9 @@ class TestGetFlags:
 class TestHealth:
     """Test GET /health endpoint."""
     
-    def test_health_check(self, client):
+    async def test_health_check(self, client):
         """Test health check returns proper structure."""
-        response = client.get("/health")
+        response = await client.get("/health")
         
         assert response.status_code == 200
         data = response.json()
@@ -136,52 +308,342 @@ class TestHealth:
         assert "database" in data
         assert "redis" in data
         assert "timestamp" in data
+    
+    async def test_health_serves_background_snapshot(self, client, mock_redis):
+        """Test /health reads the probe loop's snapshot without probing inline."""
+        from app.main import app
+        
+        app.state.health = {
+            "database": {"status": "healthy"},
+            "redis": {"status": "unhealthy", "message": "down"},
+        }
+        try:
+            response = await client.get("/health")
+        finally:
+            del app.state.health
+        
+        assert response.json()["status"] == "degraded"
+        mock_redis.health_check.assert_not_called()
+    
+    async def test_redis_health_is_cached(self):
+        """Test repeated health probes reuse one INFO snapshot."""
+        redis = RedisClient()
+        redis._client = MagicMock()
+        redis._client.ping = AsyncMock(return_value=True)
+        redis._client.info = AsyncMock(return_value={"redis_version": "7.0", "connected_clients": 3})
+        
+        first = await redis.health_check()
+        second = await redis.health_check()
+        
+        assert first == second
+        assert first["connected_clients"] == 3
+        redis._client.info.assert_awaited_once()
+        
+        await redis.health_check(force=True)
+        assert redis._client.info.await_count == 2
+    
+    async def test_probe_loop_bypasses_health_caches(self, mock_redis):
+        """Test the background probe refreshes live instead of re-storing cached results."""
+        import asyncio
+        from types import SimpleNamespace
+        from app.api.routes import health_probe_loop
+        
+        state = SimpleNamespace()
+        db_health = AsyncMock(return_value={"status": "healthy"})
+        with patch("app.api.routes.HEALTH_PROBE_INTERVAL", 0):
+            with patch("app.api.routes.check_db_health", db_health):
+                with patch("app.api.routes.redis_client", mock_redis):
+                    task = asyncio.create_task(health_probe_loop(state))
+                    while not hasattr(state, "health"):
+                        await asyncio.sleep(0)
+                    task.cancel()
+        
+        db_health.assert_awaited_with(force=True)
+        mock_redis.health_check.assert_called_with(force=True)
+
+
+class TestCors:
+    """Test the CORS allowlist."""
+    
+    async def test_unlisted_origin_gets_no_cors_headers(self, client):
+        """Test an origin outside CORS_ORIGINS is not echoed back or wildcarded."""
+        response = await client.get("/health", headers={"Origin": "https://evil.example"})
+        
+        assert response.status_code == 200
+        assert "access-control-allow-origin" not in response.headers
 
 
 class TestRedisSlidingWindow:
     """Test Redis sliding window functionality."""
     
-    def test_velocity_detection_uses_redis(self, client, base_transaction_request, mock_redis):
+    async def test_velocity_detection_uses_redis(self, client, base_transaction_request, mock_redis):
         """Test that velocity detection queries Redis."""
-        client.post("/transactions", json=base_transaction_request)
+        await client.post("/transactions", json=base_transaction_request)
         
-        # Verify Redis was queried for transaction count
-        mock_redis.get_transaction_count_in_window.assert_called()
+        # Verify every rule input came from one Redis round-trip
+        mock_redis.fetch_scoring_context.assert_called_once()
     
-    def test_recent_transaction_stored(self, client, base_transaction_request, mock_redis):
+    async def test_recent_transaction_stored(self, client, base_transaction_request, mock_redis):
         """Test that transaction is added to Redis after processing."""
-        client.post("/transactions", json=base_transaction_request)
+        await client.post("/transactions", json=base_transaction_request)
+        
+        # Verify transaction was recorded in the recent window
+        mock_redis.record_transaction.assert_called_once()
+    
+    async def test_record_transaction_single_pipeline(self):
+        """Test cache writes for a transaction share one pipeline round-trip."""
+        redis = RedisClient()
+        redis._client = MagicMock()
+        pipe = MagicMock()
+        pipe.execute = AsyncMock()
+        redis._client.pipeline.return_value.__aenter__.return_value = pipe
+        
+        await redis.record_transaction(
+            user_id="u1", device_id="dev_1", lat=12.9, lng=77.5,
+            timestamp=datetime.utcnow(), tx_id="tx1"
+        )
+        
+        redis._client.pipeline.assert_called_once_with(transaction=True)
+        pipe.setex.assert_called_once()
+        pipe.zadd.assert_called_once()
+        pipe.zremrangebyscore.assert_called_once()
+        pipe.expire.assert_called_once()
+        pipe.execute.assert_called_once()
+    
+    async def test_record_transaction_updates_amount_buckets(self):
+        """Test the amount is added to today's bucket in the same pipeline."""
+        redis = RedisClient()
+        redis._client = MagicMock()
+        pipe = MagicMock()
+        pipe.execute = AsyncMock()
+        redis._client.pipeline.return_value.__aenter__.return_value = pipe
+        now = datetime.utcnow()
+        
+        await redis.record_transaction(
+            user_id="u1", device_id=None, lat=None, lng=None,
+            timestamp=now, tx_id="tx1", amount=250.0
+        )
+        
+        day = RedisClient._epoch_day(utc_epoch(now))
+        pipe.hincrbyfloat.assert_called_once_with("AMOUNT_STATS:u1", f"{day}:s", 250.0)
+        pipe.hincrby.assert_called_once_with("AMOUNT_STATS:u1", f"{day}:c", 1)
+        pipe.execute.assert_called_once()
+    
+    async def test_window_count_uses_epoch_now(self):
+        """Test velocity windows end at the current epoch time."""
+        redis = RedisClient()
+        redis._client = MagicMock()
+        redis._client.zcount = AsyncMock(return_value=2)
+        
+        with patch("app.cache.redis_client.time.time", return_value=1_000_000.0):
+            count = await redis.get_transaction_count_in_window("u1", 60)
+        
+        assert count == 2
+        redis._client.zcount.assert_awaited_once_with("RECENT_TX:u1", 999_940.0, 1_000_000.0)
+    
+    def test_last_known_payload_round_trip(self):
+        """Test last known payloads carry the transaction time as epoch seconds."""
+        import orjson
+        
+        ts = datetime.utcnow()
+        _, payload = RedisClient()._last_known_entry("u1", "dev_1", 12.9, 77.5, ts)
+        data = orjson.loads(payload)
+        
+        assert data["device_id"] == "dev_1"
+        assert data["last_ts"] == utc_epoch(ts)
+    
+    async def test_amount_stats_sum_window_buckets(self):
+        """Test amount stats sum in-window daily buckets and skip stale ones."""
+        redis = RedisClient()
+        redis._client = MagicMock()
+        today = RedisClient._epoch_day(time.time())
+        redis._client.hgetall = AsyncMock(return_value={
+            "built": "1",
+            f"{today}:s": "300.0", f"{today}:c": "2",
+            f"{today - 29}:s": "100.0", f"{today - 29}:c": "1",
+            f"{today - 45}:s": "900.0", f"{today - 45}:c": "3",
+        })
+        
+        assert await redis.get_amount_stats("u1", days=30) == (400.0, 3)
+    
+    async def test_amount_stats_miss_when_not_built(self):
+        """Test buckets without the built marker are reported as a miss."""
+        redis = RedisClient()
+        redis._client = MagicMock()
+        redis._client.hgetall = AsyncMock(return_value={"20000:s": "50.0", "20000:c": "1"})
+        
+        assert await redis.get_amount_stats("u1") is None
+    
+    async def test_scoring_context_single_pipeline(self):
+        """Test all rule inputs are read in one pipeline execute."""
+        import orjson
+        
+        redis = RedisClient()
+        redis._client = MagicMock()
+        pipe = MagicMock()
+        pipe.execute = AsyncMock(return_value=[
+            3, 4, orjson.dumps({"device_id": "dev_1"}), None, {}
+        ])
+        redis._client.pipeline.return_value.__aenter__.return_value = pipe
+        
+        context = await redis.fetch_scoring_context("u1", "m1", 100.0)
+        
+        pipe.execute.assert_awaited_once()
+        assert context.count_high == 3
+        assert context.count_unusual == 4
+        assert context.last_known == {"device_id": "dev_1"}
+        assert context.is_duplicate is True
+        assert context.amount_stats is None
+    
+    async def test_scoring_contexts_batch_single_pipeline(self):
+        """Test batch contexts share one pipeline and map back in order."""
+        redis = RedisClient()
+        redis._client = MagicMock()
+        pipe = MagicMock()
+        pipe.execute = AsyncMock(return_value=[1, 1, None, True, {}, 2, 2, None, None, {}])
+        redis._client.pipeline.return_value.__aenter__.return_value = pipe
+        
+        contexts = await redis.fetch_scoring_contexts([("u1", "m1", 10.0), ("u1", "m1", 10.0)])
         
-        # Verify transaction was added to recent list
-        mock_redis.add_recent_transaction.assert_called()
+        pipe.execute.assert_awaited_once()
+        assert [c.count_high for c in contexts] == [1, 2]
+        assert [c.is_duplicate for c in contexts] == [False, True]
+    
+    async def test_record_transaction_caches_risk_result(self):
+        """Test the risk result is cached with the other post-commit writes."""
+        import orjson
+        
+        redis = RedisClient()
+        redis._client = MagicMock()
+        pipe = MagicMock()
+        pipe.execute = AsyncMock()
+        redis._client.pipeline.return_value.__aenter__.return_value = pipe
+        result = {"risk_score": 40, "risk_reasons": ["merchant_blacklist"], "flagged": False}
+        
+        await redis.record_transaction(
+            user_id="u1", device_id=None, lat=None, lng=None,
+            timestamp=datetime.utcnow(), tx_id="tx1", risk_result=result
+        )
+        
+        pipe.setex.assert_called_once_with("RISK:tx1", RedisClient.RISK_RESULT_TTL, orjson.dumps(result))
+        pipe.execute.assert_called_once()
+
+
+class TestDuplicateDetection:
+    """Test Redis duplicate transaction detection."""
+    
+    async def test_duplicate_uses_single_set_nx(self):
+        """Test the first writer wins and a repeat is reported as duplicate."""
+        redis = RedisClient()
+        redis._client = MagicMock()
+        redis._client.set = AsyncMock(side_effect=[True, None])
+        
+        first = await redis.check_duplicate_transaction("u1", "m1", 100.0, 30)
+        second = await redis.check_duplicate_transaction("u1", "m1", 100.0, 30)
+        
+        assert first is False
+        assert second is True
+        assert redis._client.set.await_count == 2
+        _, kwargs = redis._client.set.call_args
+        assert kwargs == {"nx": True, "ex": 30}
+    
+    def test_duplicate_key_fixed_size(self):
+        """Test duplicate keys are compact digests of the signature."""
+        redis = RedisClient()
+        short_key = redis._duplicate_key("u1", "m1", 100.0)
+        long_key = redis._duplicate_key("u" * 50, "m" * 100, 100.0)
+        
+        assert len(short_key) == len(long_key) == len(RedisClient.TX_HASH_PREFIX) + 16
+        assert short_key == redis._duplicate_key("u1", "m1", 100.00)
+        assert short_key != redis._duplicate_key("u1", "m1", 100.01)
+        # Float noise below a cent doesn't change the signature
+        assert redis._duplicate_key("u1", "m1", 0.1 + 0.2) == redis._duplicate_key("u1", "m1", 0.3)
 
 
 class TestPostgresPersistence:
     """Test PostgreSQL persistence."""
     
-    def test_transaction_persisted(self, client, db_session, base_transaction_request):
+    async def test_transaction_persisted(self, client, db_session, base_transaction_request):
         """Test that transaction is saved to database."""
         from app.db.models import Transaction
         
-        client.post("/transactions", json=base_transaction_request)
+        await client.post("/transactions", json=base_transaction_request)
         
-        tx = db_session.query(Transaction).filter(
-            Transaction.transaction_id == base_transaction_request["transaction_id"]
-        ).first()
+        tx = (await db_session.execute(
+            select(Transaction).where(
+                Transaction.transaction_id == base_transaction_request["transaction_id"]
+            )
+        )).scalar_one_or_none()
         
         assert tx is not None
         assert tx.amount == base_transaction_request["amount"]
     
-    def test_risk_log_persisted(self, client, db_session, base_transaction_request):
+    async def test_aware_timestamp_stored_as_naive_utc(self, client, db_session, base_transaction_request):
+        """Test Z/offset timestamps are accepted and stored as naive UTC."""
+        from app.db.models import Transaction
+        
+        base_transaction_request["timestamp"] = "2025-12-03T12:34:56Z"
+        response = await client.post("/transactions", json=base_transaction_request)
+        
+        offset_request = dict(base_transaction_request, transaction_id="tx_test_offset")
+        offset_request["timestamp"] = "2025-12-03T18:04:56+05:30"
+        offset_response = await client.post("/transactions", json=offset_request)
+        
+        assert response.status_code == 200
+        assert offset_response.status_code == 200
+        stored = (await db_session.execute(
+            select(Transaction.timestamp).order_by(Transaction.transaction_id)
+        )).scalars().all()
+        assert stored == [datetime(2025, 12, 3, 12, 34, 56)] * 2
+    
+    async def test_risk_log_persisted(self, client, db_session, base_transaction_request):
         """Test that risk log is saved to database."""
         from app.db.models import RiskLog
         
-        client.post("/transactions", json=base_transaction_request)
+        await client.post("/transactions", json=base_transaction_request)
         
-        log = db_session.query(RiskLog).filter(
-            RiskLog.transaction_id == base_transaction_request["transaction_id"]
-        ).first()
+        log = (await db_session.execute(
+            select(RiskLog).where(
+                RiskLog.transaction_id == base_transaction_request["transaction_id"]
+            )
+        )).scalar_one_or_none()
         
         assert log is not None
         assert log.risk_score is not None
         assert log.reasons is not None
+    
+    async def test_raw_evidence_deferred(self, client, db_session, base_transaction_request):
+        """Test raw_evidence is not loaded by default RiskLog queries."""
+        from app.db.models import RiskLog
+        
+        await client.post("/transactions", json=base_transaction_request)
+        db_session.expunge_all()
+        
+        log = (await db_session.execute(select(RiskLog))).scalar_one()
+        
+        assert "raw_evidence" not in inspect(log).dict
+
+
+class TestConnectionPool:
+    """Test database pool configuration."""
+    
+    def test_postgres_pool_uses_settings(self):
+        """Test Postgres engines are sized, bounded, and recycled from settings."""
+        from app.config import settings
+        from app.db.session import _async_database_url, _pool_options
+        
+        db_url, _ = _async_database_url("postgresql://u:p@localhost/db")
+        options = _pool_options(db_url)
+        
+        assert options["pool_size"] == settings.DB_POOL_SIZE
+        assert options["max_overflow"] == settings.DB_MAX_OVERFLOW
+        assert options["pool_timeout"] == settings.DB_POOL_TIMEOUT
+        assert options["pool_recycle"] == settings.DB_POOL_RECYCLE
+    
+    def test_sqlite_keeps_default_pool(self):
+        """Test SQLite URLs get no queue pool options."""
+        from app.db.session import _async_database_url, _pool_options
+        
+        db_url, _ = _async_database_url("sqlite:///./test.db")
+        
+        assert _pool_options(db_url) == {}
@@ -2,14 +2,20 @@
 Unit tests for the scoring engine.
 """
 import pytest
+import time
+from dataclasses import FrozenInstanceError
 from datetime import datetime, timedelta
 from unittest.mock import patch, MagicMock
 
 from app.scoring.engine import (
-    ScoringEngine, TransactionInput, haversine_distance,
+    ScoringEngine, TransactionInput, haversine_distance, haversine_vector,
+    equirectangular_distance, invalidate_amount_fallback,
     evaluate_transaction, MERCHANT_BLACKLIST
 )
 from app.db.models import Transaction, User
+from app.cache.redis_client import ScoringContext, utc_epoch
+from sqlalchemy import select
+from sqlalchemy.exc import InvalidRequestError
 
 
 class TestHaversineDistance:
@@ -31,12 +37,34 @@ class TestHaversineDistance:
         # London to New York ~5570 km
         distance = haversine_distance(51.5074, -0.1278, 40.7128, -74.0060)
         assert 5400 < distance < 5700
+    
+    def test_vector_matches_scalar(self):
+        """Batch distances match the scalar function point by point."""
+        points = [(19.0760, 72.8777), (51.5074, -0.1278), (12.9716, 77.5946)]
+        
+        distances = haversine_vector(12.9716, 77.5946, points)
+        
+        expected = [haversine_distance(12.9716, 77.5946, lat, lng) for lat, lng in points]
+        assert distances == pytest.approx(expected)
+    
+    def test_equirectangular_close_to_haversine(self):
+        """The approximation stays within 1% of haversine at threshold scale."""
+        exact = haversine_distance(12.9716, 77.5946, 17.3850, 78.4867)
+        approx = equirectangular_distance(12.9716, 77.5946, 17.3850, 78.4867)
+        
+        assert approx == pytest.approx(exact, rel=0.01)
+    
+    def test_equirectangular_wraps_antimeridian(self):
+        """Points either side of the antimeridian are close, not half a world apart."""
+        distance = equirectangular_distance(0.0, 179.5, 0.0, -179.5)
+        
+        assert distance == pytest.approx(haversine_distance(0.0, 179.5, 0.0, -179.5), rel=0.01)
 
 
 class TestAmountSpike:
     """Test amount spike detection."""
     
-    def test_amount_spike_detected(self, db_session, sample_user, sample_transactions):
+    async def test_amount_spike_detected(self, engine_redis, db_session, sample_user, sample_transactions):
         """Amount > 5x average should trigger spike."""
         tx_input = TransactionInput(
             transaction_id="tx_spike",
@@ -51,17 +79,12 @@ class TestAmountSpike:
             metadata=None
         )
         
-        with patch("app.scoring.engine.redis_client") as mock_redis:
-            mock_redis.get_last_known.return_value = None
-            mock_redis.get_transaction_count_in_window.return_value = 0
-            mock_redis.check_duplicate_transaction.return_value = False
-            
-            result = evaluate_transaction(tx_input, db_session)
+        result = await evaluate_transaction(tx_input, db_session)
         
         assert "amount_spike" in result.reasons
         assert result.score >= 30
     
-    def test_amount_spike_not_triggered(self, db_session, sample_user, sample_transactions):
+    async def test_amount_spike_not_triggered(self, engine_redis, db_session, sample_user, sample_transactions):
         """Amount within normal range should not trigger spike."""
         tx_input = TransactionInput(
             transaction_id="tx_normal",
@@ -76,20 +99,83 @@ class TestAmountSpike:
             metadata=None
         )
         
-        with patch("app.scoring.engine.redis_client") as mock_redis:
-            mock_redis.get_last_known.return_value = None
-            mock_redis.get_transaction_count_in_window.return_value = 0
-            mock_redis.check_duplicate_transaction.return_value = False
-            
-            result = evaluate_transaction(tx_input, db_session)
+        result = await evaluate_transaction(tx_input, db_session)
         
         assert "amount_spike" not in result.reasons
+    
+    async def test_amount_spike_uses_cached_stats(self, engine_redis, db_session, sample_user, count_queries):
+        """Cached amount buckets are used without querying the database."""
+        tx_input = TransactionInput(
+            transaction_id="tx_cached_avg",
+            user_id=sample_user.user_id,
+            amount=600.0,
+            currency="INR",
+            merchant_id="m_normal",
+            timestamp=datetime.utcnow(),
+            location_lat=None,
+            location_lng=None,
+            device_id=None,
+            metadata=None
+        )
+        
+        engine_redis.fetch_scoring_context.return_value = ScoringContext(amount_stats=(500.0, 5))
+        
+        count_queries.clear()
+        result = await evaluate_transaction(tx_input, db_session)
+        
+        assert "amount_spike" in result.reasons
+        assert count_queries == []
+        engine_redis.rebuild_amount_stats.assert_not_called()
+    
+    async def test_amount_stats_rebuilt_on_miss(self, engine_redis, db_session, sample_user, sample_transactions):
+        """A bucket miss falls back to the database and rebuilds the buckets."""
+        tx_input = TransactionInput(
+            transaction_id="tx_rebuild",
+            user_id=sample_user.user_id,
+            amount=150.0,
+            currency="INR",
+            merchant_id="m_normal",
+            timestamp=datetime.utcnow(),
+            location_lat=None,
+            location_lng=None,
+            device_id=None,
+            metadata=None
+        )
+        
+        await evaluate_transaction(tx_input, db_session)
+        
+        user_id, history = engine_redis.rebuild_amount_stats.call_args.args
+        assert user_id == sample_user.user_id
+        assert len(history) == len(sample_transactions)
+    
+    async def test_amount_fallback_cached_until_invalidated(self, engine_redis, db_session, sample_user, sample_transactions):
+        """Back-to-back misses share one database query until the user's history changes."""
+        tx_input = TransactionInput(
+            transaction_id="tx_fallback_cache",
+            user_id=sample_user.user_id,
+            amount=150.0,
+            currency="INR",
+            merchant_id="m_normal",
+            timestamp=datetime.utcnow(),
+            location_lat=None,
+            location_lng=None,
+            device_id=None,
+            metadata=None
+        )
+        
+        await evaluate_transaction(tx_input, db_session)
+        await evaluate_transaction(tx_input, db_session)
+        assert engine_redis.rebuild_amount_stats.await_count == 1
+        
+        invalidate_amount_fallback(sample_user.user_id)
+        await evaluate_transaction(tx_input, db_session)
+        assert engine_redis.rebuild_amount_stats.await_count == 2
 
 
 class TestVelocitySpike:
     """Test velocity detection."""
     
-    def test_velocity_spike_high(self, db_session, sample_user):
+    async def test_velocity_spike_high(self, engine_redis, db_session, sample_user):
         """3+ transactions in 60 seconds should trigger velocity_spike."""
         tx_input = TransactionInput(
             transaction_id="tx_velocity",
@@ -104,17 +190,14 @@ class TestVelocitySpike:
             metadata=None
         )
         
-        with patch("app.scoring.engine.redis_client") as mock_redis:
-            mock_redis.get_last_known.return_value = None
-            mock_redis.get_transaction_count_in_window.side_effect = lambda uid, window: 3 if window == 60 else 0
-            mock_redis.check_duplicate_transaction.return_value = False
-            
-            result = evaluate_transaction(tx_input, db_session)
+        engine_redis.fetch_scoring_context.return_value = ScoringContext(count_high=3)
+        
+        result = await evaluate_transaction(tx_input, db_session)
         
         assert "velocity_spike" in result.reasons
         assert result.score >= 25
     
-    def test_velocity_unusual(self, db_session, sample_user):
+    async def test_velocity_unusual(self, engine_redis, db_session, sample_user):
         """5+ transactions in 10 minutes should trigger velocity_unusual."""
         tx_input = TransactionInput(
             transaction_id="tx_velocity_unusual",
@@ -129,13 +212,10 @@ class TestVelocitySpike:
             metadata=None
         )
         
-        with patch("app.scoring.engine.redis_client") as mock_redis:
-            mock_redis.get_last_known.return_value = None
-            # 2 in 60s (not spike), but 5 in 10 min (unusual)
-            mock_redis.get_transaction_count_in_window.side_effect = lambda uid, window: 2 if window == 60 else 5
-            mock_redis.check_duplicate_transaction.return_value = False
-            
-            result = evaluate_transaction(tx_input, db_session)
+        # 2 in 60s (not spike), but 5 in 10 min (unusual)
+        engine_redis.fetch_scoring_context.return_value = ScoringContext(count_high=2, count_unusual=5)
+        
+        result = await evaluate_transaction(tx_input, db_session)
         
         assert "velocity_unusual" in result.reasons
         assert result.score >= 15
@@ -144,7 +224,7 @@ class TestVelocitySpike:
 class TestLocationMismatch:
     """Test location mismatch detection."""
     
-    def test_location_mismatch_detected(self, db_session, sample_user):
+    async def test_location_mismatch_detected(self, engine_redis, db_session, sample_user):
         """Location change > 500km in < 12 hours should trigger."""
         tx_input = TransactionInput(
             transaction_id="tx_location",
@@ -164,20 +244,45 @@ class TestLocationMismatch:
             "device_id": "dev_1",
             "lat": 12.9716,  # Bangalore
             "lng": 77.5946,
-            "last_timestamp": (datetime.utcnow() - timedelta(hours=2)).isoformat()
+            "last_ts": utc_epoch(datetime.utcnow() - timedelta(hours=2))
         }
         
-        with patch("app.scoring.engine.redis_client") as mock_redis:
-            mock_redis.get_last_known.return_value = last_known
-            mock_redis.get_transaction_count_in_window.return_value = 0
-            mock_redis.check_duplicate_transaction.return_value = False
-            
-            result = evaluate_transaction(tx_input, db_session)
+        engine_redis.fetch_scoring_context.return_value = ScoringContext(last_known=last_known)
+        
+        result = await evaluate_transaction(tx_input, db_session)
         
         assert "location_mismatch" in result.reasons
         assert result.score >= 20
     
-    def test_location_mismatch_not_triggered_slow_travel(self, db_session, sample_user):
+    async def test_location_mismatch_legacy_iso_timestamp(self, engine_redis, db_session, sample_user):
+        """Last known entries written with an ISO timestamp are still read."""
+        tx_input = TransactionInput(
+            transaction_id="tx_location_legacy",
+            user_id=sample_user.user_id,
+            amount=100.0,
+            currency="INR",
+            merchant_id="m_normal",
+            timestamp=datetime.utcnow(),
+            location_lat=40.7128,  # New York
+            location_lng=-74.0060,
+            device_id="dev_1",
+            metadata=None
+        )
+        
+        last_known = {
+            "device_id": "dev_1",
+            "lat": 12.9716,  # Bangalore
+            "lng": 77.5946,
+            "last_timestamp": (datetime.utcnow() - timedelta(hours=2)).isoformat()
+        }
+        
+        engine_redis.fetch_scoring_context.return_value = ScoringContext(last_known=last_known)
+        
+        result = await evaluate_transaction(tx_input, db_session)
+        
+        assert "location_mismatch" in result.reasons
+    
+    async def test_location_mismatch_not_triggered_slow_travel(self, engine_redis, db_session, sample_user):
         """Location change > 500km in > 12 hours should not trigger."""
         tx_input = TransactionInput(
             transaction_id="tx_location_ok",
@@ -197,15 +302,12 @@ class TestLocationMismatch:
             "device_id": "dev_1",
             "lat": 12.9716,
             "lng": 77.5946,
-            "last_timestamp": (datetime.utcnow() - timedelta(hours=24)).isoformat()
+            "last_ts": utc_epoch(datetime.utcnow() - timedelta(hours=24))
         }
         
-        with patch("app.scoring.engine.redis_client") as mock_redis:
-            mock_redis.get_last_known.return_value = last_known
-            mock_redis.get_transaction_count_in_window.return_value = 0
-            mock_redis.check_duplicate_transaction.return_value = False
-            
-            result = evaluate_transaction(tx_input, db_session)
+        engine_redis.fetch_scoring_context.return_value = ScoringContext(last_known=last_known)
+        
+        result = await evaluate_transaction(tx_input, db_session)
         
         assert "location_mismatch" not in result.reasons
 
@@ -213,7 +315,7 @@ class TestLocationMismatch:
 class TestDeviceChange:
     """Test device change detection."""
     
-    def test_device_change_detected(self, db_session, sample_user):
+    async def test_device_change_detected(self, engine_redis, db_session, sample_user):
         """Different device from last known should trigger."""
         tx_input = TransactionInput(
             transaction_id="tx_device",
@@ -232,20 +334,17 @@ class TestDeviceChange:
             "device_id": "old_device",
             "lat": None,
             "lng": None,
-            "last_timestamp": datetime.utcnow().isoformat()
+            "last_ts": time.time()
         }
         
-        with patch("app.scoring.engine.redis_client") as mock_redis:
-            mock_redis.get_last_known.return_value = last_known
-            mock_redis.get_transaction_count_in_window.return_value = 0
-            mock_redis.check_duplicate_transaction.return_value = False
-            
-            result = evaluate_transaction(tx_input, db_session)
+        engine_redis.fetch_scoring_context.return_value = ScoringContext(last_known=last_known)
+        
+        result = await evaluate_transaction(tx_input, db_session)
         
         assert "device_change" in result.reasons
         assert result.score >= 10
     
-    def test_same_device_no_trigger(self, db_session, sample_user):
+    async def test_same_device_no_trigger(self, engine_redis, db_session, sample_user):
         """Same device should not trigger."""
         tx_input = TransactionInput(
             transaction_id="tx_same_device",
@@ -264,23 +363,51 @@ class TestDeviceChange:
             "device_id": "dev_1",
             "lat": None,
             "lng": None,
-            "last_timestamp": datetime.utcnow().isoformat()
+            "last_ts": time.time()
         }
         
-        with patch("app.scoring.engine.redis_client") as mock_redis:
-            mock_redis.get_last_known.return_value = last_known
-            mock_redis.get_transaction_count_in_window.return_value = 0
-            mock_redis.check_duplicate_transaction.return_value = False
-            
-            result = evaluate_transaction(tx_input, db_session)
+        engine_redis.fetch_scoring_context.return_value = ScoringContext(last_known=last_known)
+        
+        result = await evaluate_transaction(tx_input, db_session)
         
         assert "device_change" not in result.reasons
+    
+    async def test_location_and_device_share_one_fetch(self, engine_redis, db_session, sample_user):
+        """Location and device rules read the same last known state from one fetch."""
+        tx_input = TransactionInput(
+            transaction_id="tx_shared_last_known",
+            user_id=sample_user.user_id,
+            amount=100.0,
+            currency="INR",
+            merchant_id="m_normal",
+            timestamp=datetime.utcnow(),
+            location_lat=40.7128,  # New York
+            location_lng=-74.0060,
+            device_id="new_device",
+            metadata=None
+        )
+        
+        last_known = {
+            "device_id": "old_device",
+            "lat": 12.9716,  # Bangalore
+            "lng": 77.5946,
+            "last_ts": utc_epoch(datetime.utcnow() - timedelta(hours=1))
+        }
+        
+        engine_redis.fetch_scoring_context.return_value = ScoringContext(last_known=last_known)
+        
+        result = await evaluate_transaction(tx_input, db_session)
+        
+        assert "location_mismatch" in result.reasons
+        assert "device_change" in result.reasons
+        engine_redis.fetch_scoring_context.assert_awaited_once()
+        engine_redis.get_last_known.assert_not_called()
 
 
 class TestDuplicateTransaction:
     """Test duplicate transaction detection."""
     
-    def test_duplicate_detected(self, db_session, sample_user):
+    async def test_duplicate_detected(self, engine_redis, db_session, sample_user):
         """Same amount + merchant within 30s should trigger."""
         tx_input = TransactionInput(
             transaction_id="tx_dup",
@@ -295,12 +422,9 @@ class TestDuplicateTransaction:
             metadata=None
         )
         
-        with patch("app.scoring.engine.redis_client") as mock_redis:
-            mock_redis.get_last_known.return_value = None
-            mock_redis.get_transaction_count_in_window.return_value = 0
-            mock_redis.check_duplicate_transaction.return_value = True  # Duplicate found!
-            
-            result = evaluate_transaction(tx_input, db_session)
+        engine_redis.fetch_scoring_context.return_value = ScoringContext(is_duplicate=True)  # Duplicate found!
+        
+        result = await evaluate_transaction(tx_input, db_session)
         
         assert "duplicate_transaction" in result.reasons
         assert result.score >= 35
@@ -309,7 +433,7 @@ class TestDuplicateTransaction:
 class TestMerchantBlacklist:
     """Test merchant blacklist detection."""
     
-    def test_blacklisted_merchant(self, db_session, sample_user):
+    async def test_blacklisted_merchant(self, engine_redis, db_session, sample_user):
         """Transaction with blacklisted merchant should trigger."""
         tx_input = TransactionInput(
             transaction_id="tx_blacklist",
@@ -324,17 +448,12 @@ class TestMerchantBlacklist:
             metadata=None
         )
         
-        with patch("app.scoring.engine.redis_client") as mock_redis:
-            mock_redis.get_last_known.return_value = None
-            mock_redis.get_transaction_count_in_window.return_value = 0
-            mock_redis.check_duplicate_transaction.return_value = False
-            
-            result = evaluate_transaction(tx_input, db_session)
+        result = await evaluate_transaction(tx_input, db_session)
         
         assert "merchant_blacklist" in result.reasons
         assert result.score >= 40
     
-    def test_fraud_merchant_blacklisted(self, db_session, sample_user):
+    async def test_fraud_merchant_blacklisted(self, engine_redis, db_session, sample_user):
         """Test the 'fraud_merchant' is also blacklisted."""
         tx_input = TransactionInput(
             transaction_id="tx_fraud_merchant",
@@ -349,12 +468,7 @@ class TestMerchantBlacklist:
             metadata=None
         )
         
-        with patch("app.scoring.engine.redis_client") as mock_redis:
-            mock_redis.get_last_known.return_value = None
-            mock_redis.get_transaction_count_in_window.return_value = 0
-            mock_redis.check_duplicate_transaction.return_value = False
-            
-            result = evaluate_transaction(tx_input, db_session)
+        result = await evaluate_transaction(tx_input, db_session)
         
         assert "merchant_blacklist" in result.reasons
 
@@ -362,7 +476,7 @@ class TestMerchantBlacklist:
 class TestScoreCapping:
     """Test that scores are properly capped."""
     
-    def test_score_caps_at_100(self, db_session, sample_user, sample_transactions):
+    async def test_score_caps_at_100(self, engine_redis, db_session, sample_user, sample_transactions):
         """Score should never exceed 100 even with multiple triggers."""
         tx_input = TransactionInput(
             transaction_id="tx_max",
@@ -381,20 +495,22 @@ class TestScoreCapping:
             "device_id": "old_device",
             "lat": 12.9716,
             "lng": 77.5946,
-            "last_timestamp": (datetime.utcnow() - timedelta(hours=1)).isoformat()
+            "last_ts": utc_epoch(datetime.utcnow() - timedelta(hours=1))
         }
         
-        with patch("app.scoring.engine.redis_client") as mock_redis:
-            mock_redis.get_last_known.return_value = last_known
-            mock_redis.get_transaction_count_in_window.side_effect = lambda uid, window: 5
-            mock_redis.check_duplicate_transaction.return_value = True
-            
-            result = evaluate_transaction(tx_input, db_session)
+        engine_redis.fetch_scoring_context.return_value = ScoringContext(
+            count_high=5,
+            count_unusual=5,
+            last_known=last_known,
+            is_duplicate=True
+        )
+        
+        result = await evaluate_transaction(tx_input, db_session)
         
         assert result.score <= 100
         assert result.score >= 0
     
-    def test_score_minimum_is_zero(self, db_session, sample_user):
+    async def test_score_minimum_is_zero(self, engine_redis, db_session, sample_user):
         """Score should never go below 0."""
         tx_input = TransactionInput(
             transaction_id="tx_clean",
@@ -409,20 +525,98 @@ class TestScoreCapping:
             metadata=None
         )
         
-        with patch("app.scoring.engine.redis_client") as mock_redis:
-            mock_redis.get_last_known.return_value = None
-            mock_redis.get_transaction_count_in_window.return_value = 0
-            mock_redis.check_duplicate_transaction.return_value = False
-            
-            result = evaluate_transaction(tx_input, db_session)
+        result = await evaluate_transaction(tx_input, db_session)
         
         assert result.score >= 0
+    
+    async def test_prefetched_context_skips_redis(self, engine_redis, db_session, sample_user):
+        """A context fetched by the caller is used as-is."""
+        tx_input = TransactionInput(
+            transaction_id="tx_prefetched",
+            user_id=sample_user.user_id,
+            amount=100.0,
+            currency="INR",
+            merchant_id="m_normal",
+            timestamp=datetime.utcnow(),
+            location_lat=None,
+            location_lng=None,
+            device_id=None,
+            metadata=None
+        )
+        
+        result = await evaluate_transaction(
+            tx_input, db_session, ScoringContext(is_duplicate=True)
+        )
+        
+        assert "duplicate_transaction" in result.reasons
+        engine_redis.fetch_scoring_context.assert_not_called()
+    
+    async def test_fast_flag_skips_amount_history(self, engine_redis, db_session, sample_user, count_queries):
+        """Once in-memory rules flag the transaction, fast_flag skips the DB rule."""
+        tx_input = TransactionInput(
+            transaction_id="tx_fast_flag",
+            user_id=sample_user.user_id,
+            amount=100.0,
+            currency="INR",
+            merchant_id="m_blacklisted",
+            timestamp=datetime.utcnow(),
+            location_lat=None,
+            location_lng=None,
+            device_id=None,
+            metadata=None
+        )
+        
+        count_queries.clear()
+        result = await evaluate_transaction(
+            tx_input, db_session, ScoringContext(is_duplicate=True), fast_flag=True
+        )
+        
+        assert result.flagged
+        assert "amount_spike" not in result.evidence
+        assert count_queries == []
+    
+    async def test_fast_flag_skips_location_once_flagged(self, engine_redis, db_session, sample_user):
+        """fast_flag stops before the distance math once the score is flagged."""
+        tx_input = TransactionInput(
+            transaction_id="tx_fast_flag_loc",
+            user_id=sample_user.user_id,
+            amount=100.0,
+            currency="INR",
+            merchant_id="m_blacklisted",
+            timestamp=datetime.utcnow(),
+            location_lat=28.6139,
+            location_lng=77.2090,
+            device_id="device_1",
+            metadata=None
+        )
+        context = ScoringContext(
+            is_duplicate=True,
+            last_known={
+                "lat": 19.0760,
+                "lng": 72.8777,
+                "last_ts": utc_epoch(datetime.utcnow() - timedelta(hours=1))
+            }
+        )
+        
+        with patch("app.scoring.engine.equirectangular_distance") as mock_distance:
+            fast = await evaluate_transaction(
+                tx_input, db_session, context, fast_flag=True
+            )
+        
+        assert fast.flagged
+        assert "location" not in fast.evidence
+        mock_distance.assert_not_called()
+        
+        full = await evaluate_transaction(tx_input, db_session, context)
+        
+        assert full.flagged
+        assert "location_mismatch" in full.reasons
 
 
 class TestIdempotency:
     """Test that same input produces same output."""
     
-    def test_idempotency_returns_same_results(self, db_session, sample_user):
+    async def test_idempotency_returns_same_results(self, engine_redis, db_session, sample_user):
         """Same transaction evaluated twice should return same results."""
         tx_input = TransactionInput(
             transaction_id="tx_idemp",
@@ -437,13 +631,46 @@ class TestIdempotency:
             metadata=None
         )
         
-        with patch("app.scoring.engine.redis_client") as mock_redis:
-            mock_redis.get_last_known.return_value = None
-            mock_redis.get_transaction_count_in_window.return_value = 0
-            mock_redis.check_duplicate_transaction.return_value = False
-            
-            result1 = evaluate_transaction(tx_input, db_session)
-            result2 = evaluate_transaction(tx_input, db_session)
+        result1 = await evaluate_transaction(tx_input, db_session)
+        result2 = await evaluate_transaction(tx_input, db_session)
         
         assert result1.score == result2.score
         assert result1.reasons == result2.reasons
+
+
+class TestTransactionInput:
+    """Test the scoring input struct."""
+    
+    def test_is_frozen_and_slotted(self):
+        """Inputs can't be mutated and carry no per-instance __dict__."""
+        ts = datetime(2024, 1, 1, 12, 0, 0)
+        tx_input = TransactionInput(
+            transaction_id="tx_frozen",
+            user_id="u_1",
+            amount=100.0,
+            currency="INR",
+            merchant_id="m_normal",
+            timestamp=ts,
+            location_lat=None,
+            location_lng=None,
+            device_id=None,
+            metadata=None
+        )
+        
+        assert tx_input.timestamp_epoch == 1704110400.0  # read as UTC, not host time
+        assert not hasattr(tx_input, "__dict__")
+        with pytest.raises(FrozenInstanceError):
+            tx_input.amount = 1.0
+
+
+class TestRelationshipLoading:
+    """Test that relationships never load implicitly."""
+    
+    async def test_lazy_relationship_access_raises(self, db_session, sample_transactions):
+        """Touching an unloaded relationship should raise instead of querying."""
+        tx = (await db_session.execute(
+            select(Transaction).where(Transaction.transaction_id == "hist_tx_0")
+        )).scalar_one()
+        
+        with pytest.raises(InvalidRequestError):
+            tx.user
@@ -1,22 +1,30 @@
-import sys
-import os
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from mangum import Mangum
-
-# Add the app directory to the path
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
-from app.main import app as fastapi_app
-
-# Add CORS middleware
-fastapi_app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Create the handler for Netlify
-handler = Mangum(fastapi_app)
+import sys
+import os
+from mangum import Mangum
+
+# CORS is configured on the app itself in app/main.py
+try:
+    from app.main import app as fastapi_app
+except ModuleNotFoundError as e:
+    if e.name != "app":
+        raise
+    # Repository root isn't on PYTHONPATH (e.g. local runs): add it once,
+    # ahead of site-packages so this checkout's modules resolve first
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app.main import app as fastapi_app
+
+# Create the handler for Netlify
+handler = Mangum(fastapi_app)
+
+
+if __name__ == "__main__":
+    # Long-lived server alternative to the per-invocation handler:
+    # workers keep their connection pools warm across requests
+    import uvicorn
+
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=int(os.environ.get("PORT", "8000")),
+        workers=os.cpu_count() or 1
+    )
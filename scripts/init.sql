@@ -38,11 +38,11 @@ CREATE TABLE IF NOT EXISTS risk_logs (
 CREATE INDEX IF NOT EXISTS idx_transactions_user_id ON transactions(user_id);
 CREATE INDEX IF NOT EXISTS idx_transactions_merchant_id ON transactions(merchant_id);
 CREATE INDEX IF NOT EXISTS idx_transactions_timestamp ON transactions(timestamp);
-CREATE INDEX IF NOT EXISTS idx_transactions_user_timestamp ON transactions(user_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_user_timestamp_amount ON transactions(user_id, timestamp DESC) INCLUDE (amount);
 CREATE INDEX IF NOT EXISTS idx_transactions_user_merchant_amount ON transactions(user_id, merchant_id, amount);
-CREATE INDEX IF NOT EXISTS idx_risk_logs_transaction_id ON risk_logs(transaction_id);
+CREATE INDEX IF NOT EXISTS idx_risk_txid_covering ON risk_logs(transaction_id) INCLUDE (risk_score, reasons);
 CREATE INDEX IF NOT EXISTS idx_risk_logs_user_id ON risk_logs(user_id);
-CREATE INDEX IF NOT EXISTS idx_risk_logs_risk_score ON risk_logs(risk_score);
+CREATE INDEX IF NOT EXISTS idx_risk_score_evaluated ON risk_logs(risk_score DESC, evaluated_at DESC);
 
 -- Insert some test data
 INSERT INTO users (user_id) VALUES 